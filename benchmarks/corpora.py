@@ -0,0 +1,45 @@
+"""Corpora the benchmarks run on.
+
+``synthetic`` corpora follow the word bigrams and sentence lengths of the
+Tao corpus, plus a long tail of made-up words whose number grows with the
+corpus, so larger scales also mean a larger vocabulary. They only depend
+on ``scale`` and ``seed``.
+"""
+import io
+import os.path
+import random
+import re
+
+TAO = os.path.join(os.path.dirname(__file__), "..", "inputs", "tao.txt")
+WORD = re.compile(r"\w+", re.UNICODE)
+RARE_WORDS = 0.05
+
+def tao():
+    with io.open(TAO, encoding="utf-8") as f:
+        return f.read()
+
+def synthetic(scale, seed=0):
+    """Returns about ``scale`` times as much text as the Tao corpus"""
+    from markogen.tokenizers import SentenceTokenizer
+    text = tao()
+    sentences = SentenceTokenizer().split(text)
+    words = WORD.findall(text)
+    lengths = [max(1, len(WORD.findall(sentence))) for sentence in sentences]
+    followers = {}
+    for prev, word in zip(words, words[1:]):
+        followers.setdefault(prev.lower(), []).append(word)
+    rng = random.Random(seed)
+    rare_words = int(len(set(words)) * scale ** 0.5)
+
+    out, size, limit = [], 0, len(text) * scale
+    while size < limit:
+        sentence = [rng.choice(words)]
+        for _ in range(rng.choice(lengths) - 1):
+            if rng.random() < RARE_WORDS:
+                sentence.append(u"w%d"%(int(rng.paretovariate(0.5)) % rare_words))
+            else:
+                sentence.append(rng.choice(followers.get(sentence[-1].lower(), words)))
+        sentence = u" ".join(sentence)
+        out.append(sentence[0].upper() + sentence[1:] + rng.choice(u"...?!"))
+        size += len(out[-1]) + 1
+    return u" ".join(out)
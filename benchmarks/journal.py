@@ -0,0 +1,80 @@
+"""Cost of adding the same new text to saved models of growing size:
+appending its counts to the model's delta journal (load, learn) against
+persisting it by rewriting the model (load, learn, save), and folding the
+journal into the model (compact). Results are written as JSON::
+
+    python -m benchmarks.journal --scales 10 100 -o journal.json
+"""
+import argparse
+import json
+import os.path
+import shutil
+import sys
+import tempfile
+
+from markogen.generators import MarkovGenerator
+
+from . import corpora
+from .run import clock
+
+SCALES = [10, 100]
+ORDER = 2
+
+def ingest(path, text, save_path=None):
+    started = clock()
+    generator = MarkovGenerator.load(path)
+    generator.learn(text)
+    if save_path is not None:
+        generator.save(save_path)
+    return clock() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.journal")
+    parser.add_argument( "--scales", type=int, nargs="*", default=SCALES,
+                         help='Synthetic corpus sizes, as multiples of the Tao corpus, '
+                              'default = %s'%" ".join(map(str, SCALES)),)
+    parser.add_argument( "--order", type=int, default=ORDER,
+                         help='Markov order, default = %d'%ORDER,)
+    parser.add_argument( "-o", "--output",
+                         help='Write the results to this file instead of stdout',)
+    args = parser.parse_args(argv)
+
+    new_text = corpora.synthetic(1, seed=1)
+    corpus = [("tao", corpora.tao())] + [("synthetic-x%d"%scale, corpora.synthetic(scale))
+                                         for scale in args.scales]
+    workdir = tempfile.mkdtemp()
+    results = []
+    try:
+        for name, text in corpus:
+            path = os.path.join(workdir, name + ".bin")
+            generator = MarkovGenerator(args.order)
+            generator.learn_bulk(text)
+            generator.save(path)
+            rewrite_s = ingest(path, new_text, os.path.join(workdir, name + ".rewritten.bin"))
+            # learning on the loaded model journaled the text as well
+            os.remove(path + ".delta")
+            journal_s = ingest(path, new_text)
+            journal_bytes = os.path.getsize(path + ".delta")
+            started = clock()
+            MarkovGenerator.load(path).compact()
+            compact_s = clock() - started
+            result = {"corpus": name, "chars": len(text), "new_chars": len(new_text),
+                      "order": args.order, "model_bytes": os.path.getsize(path),
+                      "journal_s": journal_s, "journal_bytes": journal_bytes,
+                      "rewrite_s": rewrite_s, "compact_s": compact_s}
+            sys.stderr.write("%-16s new text journaled in %.3fs, rewritten in %.3fs, "
+                             "compacted in %.3fs\n"%(name, journal_s, rewrite_s, compact_s))
+            results.append(result)
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {"python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
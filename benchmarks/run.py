@@ -0,0 +1,132 @@
+"""Training and generation benchmarks.
+
+Every (corpus, order) case runs in a fresh process so its peak RSS is the
+model's own. The results are written as JSON, one record per case, so runs
+can be compared::
+
+    python -m benchmarks.run -o before.json
+    python -m benchmarks.run --scales 10 100 --orders 2 3 -o after.json
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+
+from markogen.generators import MarkovGenerator
+
+from . import corpora
+
+try:
+    clock = time.perf_counter
+except AttributeError: # python 2
+    clock = time.time
+
+SCALES = [10, 100, 1000]
+ORDERS = [1, 2, 3, 4, 5]
+NUM_SENTENCES = 1000
+MAX_LEN = 150
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+def load_corpus(name):
+    if name == "tao":
+        return corpora.tao()
+    return corpora.synthetic(int(name.split("x")[1]))
+
+def run_case(args):
+    """Benchmarks one corpus at one order, in a worker process"""
+    name, order, num_sentences, max_len = args
+    text = load_corpus(name)
+    rss_before = peak_rss_kb()
+
+    generator = MarkovGenerator(order, rng=0)
+    tokenizer = generator.graph.tokenizer
+    sentences = generator.set_tokenizer.split(text)
+    num_tokens = sum(len(tokenizer.tokenize(sentence)) for sentence in sentences)
+    started = clock()
+    generator.learn(text)
+    learn_s = clock() - started
+
+    # compiling and building the length tables is paid once, not per sentence
+    started = clock()
+    generator.compile()
+    list(generator.generate(1, max_len))
+    compile_s = clock() - started
+
+    latencies = []
+    walks = generator.generate(num_sentences, max_len)
+    for _ in range(num_sentences):
+        started = clock()
+        next(walks)
+        latencies.append((clock() - started) * 1000)
+
+    return {
+        "corpus": name,
+        "order": order,
+        "chars": len(text),
+        "sentences": len(sentences),
+        "tokens": num_tokens,
+        "nodes": generator.graph.num_nodes(),
+        "edges": generator.graph.num_edges(),
+        "learn_s": learn_s,
+        "learn_sentences_per_s": len(sentences) / learn_s,
+        "learn_tokens_per_s": num_tokens / learn_s,
+        "compile_s": compile_s,
+        "generate_p50_ms": percentile(latencies, 50),
+        "generate_p99_ms": percentile(latencies, 99),
+        "generate_mean_ms": sum(latencies) / len(latencies),
+        "peak_rss_kb": peak_rss_kb(),
+        "model_rss_kb": peak_rss_kb() - rss_before,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument( "--scales", type=int, nargs="*", default=SCALES,
+                         help='Synthetic corpus sizes, as multiples of the Tao corpus, '
+                              'default = %s'%" ".join(map(str, SCALES)),)
+    parser.add_argument( "--orders", type=int, nargs="+", default=ORDERS,
+                         help='Markov orders, default = 1 to 5',)
+    parser.add_argument( "-n", "--num_sentences", type=int, default=NUM_SENTENCES,
+                         help='Sentences generated per case, default = %d'%NUM_SENTENCES,)
+    parser.add_argument( "-m", "--max_len", type=int, default=MAX_LEN,
+                         help='Maximum character per sentence, default = %d'%MAX_LEN,)
+    parser.add_argument( "-o", "--output",
+                         help='Write the results to this file instead of stdout',)
+    args = parser.parse_args(argv)
+
+    names = ["tao"] + ["synthetic-x%d"%scale for scale in args.scales]
+    results = []
+    for name in names:
+        for order in args.orders:
+            # a new process per case, so that peak RSS is the case's own
+            pool = multiprocessing.Pool(1)
+            try:
+                result = pool.apply(run_case, ((name, order, args.num_sentences,
+                                                args.max_len),))
+            finally:
+                pool.terminate()
+            sys.stderr.write("%-16s order %d: %8.0f sentences/s, p99 %.3fms, %dkB\n"%(
+                name, order, result["learn_sentences_per_s"],
+                result["generate_p99_ms"], result["peak_rss_kb"]))
+            results.append(result)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Accuracy of the count-min sketch backend against exact counting, for a
+range of sketch widths, on a synthetic corpus. For each width the report
+gives the memory used by the transition counts (the successor tables plus
+the sketch, against the exact successor tables) and:
+
+- ``coverage``: share of the learnt transitions the kept edges account for,
+- ``count_error``: mean relative overestimate of the kept edge counts,
+- ``tv_distance``: total variation distance between the exact and the
+  sketched next-context distributions, averaged over contexts weighted by
+  their number of transitions.
+
+Results are written as JSON::
+
+    python -m benchmarks.sketch --scale 10 --orders 1 2 -o sketch.json
+"""
+import argparse
+import json
+import sys
+
+import six
+
+from markogen.generators import MarkovGenerator, SketchMarkovGenerator
+from markogen.sketch import DEPTH, HEAVY_HITTERS
+from markogen.tools import deep_sizeof
+
+from . import corpora
+from .run import clock
+
+SCALE = 10
+ORDERS = [1, 2]
+WIDTHS = [1 << 10, 1 << 12, 1 << 14, 1 << 16]
+
+def accuracy(exact, sketch):
+    """Compares the successors of each context of ``exact`` with those of
+    ``sketch``, both ``MarkovGraph`` s learnt from the same text.
+    """
+    kept = overestimate = num_edges = 0
+    distance = 0.0
+    for node, nbrs in enumerate(exact.succ):
+        if not nbrs:
+            continue
+        sketch_node = sketch.toks[exact.node_by_id(node)]
+        sketch_nbrs = sketch.succ[sketch_node]
+        total = sum(packed >> 1 for packed in six.itervalues(nbrs))
+        estimated = sum(packed >> 1 for packed in six.itervalues(sketch_nbrs))
+        keys = lambda node_ids, graph: {graph.node_by_id(node_id): node_id
+                                        for node_id in node_ids}
+        exact_succ, sketch_succ = keys(nbrs, exact), keys(sketch_nbrs, sketch)
+        gap = 0.0
+        for key in set(exact_succ) | set(sketch_succ):
+            count = nbrs[exact_succ[key]] >> 1 if key in exact_succ else 0
+            estimate = sketch_nbrs[sketch_succ[key]] >> 1 if key in sketch_succ else 0
+            gap += abs(count * 1.0 / total - estimate * 1.0 / estimated)
+            if key in sketch_succ:
+                kept += count
+                overestimate += (estimate - count) * 1.0 / count
+                num_edges += 1
+        distance += gap / 2 * total
+    transitions = exact.transition_total
+    return {"coverage": kept * 1.0 / transitions,
+            "count_error": overestimate / max(1, num_edges),
+            "tv_distance": distance / transitions}
+
+def learn(generator, text):
+    started = clock()
+    generator.learn_bulk(text)
+    return clock() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.sketch")
+    parser.add_argument( "--scale", type=int, default=SCALE,
+                         help='Synthetic corpus size, as a multiple of the Tao corpus, '
+                              'default = %d'%SCALE,)
+    parser.add_argument( "--orders", type=int, nargs="+", default=ORDERS,
+                         help='Markov orders, default = %s'%" ".join(map(str, ORDERS)),)
+    parser.add_argument( "--widths", type=int, nargs="+", default=WIDTHS,
+                         help='Sketch widths, default = %s'%" ".join(map(str, WIDTHS)),)
+    parser.add_argument( "--depth", type=int, default=DEPTH,
+                         help='Sketch depth, default = %d'%DEPTH,)
+    parser.add_argument( "-k", "--heavy_hitters", type=int, default=HEAVY_HITTERS,
+                         help='Successors kept per context, default = %d'%HEAVY_HITTERS,)
+    parser.add_argument( "-o", "--output",
+                         help='Write the results to this file instead of stdout',)
+    args = parser.parse_args(argv)
+
+    text = corpora.synthetic(args.scale)
+    results = []
+    for order in args.orders:
+        exact = MarkovGenerator(order)
+        exact_s = learn(exact, text)
+        exact_bytes = deep_sizeof(exact.graph.succ)
+        results.append({"order": order, "backend": "exact", "learn_s": exact_s,
+                        "count_bytes": exact_bytes, "edges": exact.graph.num_edges(),
+                        "coverage": 1.0, "count_error": 0.0, "tv_distance": 0.0})
+        for width in args.widths:
+            generator = SketchMarkovGenerator(order, width, args.depth, args.heavy_hitters)
+            learn_s = learn(generator, text)
+            graph = generator.graph
+            graph.refresh()
+            result = {"order": order, "backend": "sketch", "width": width,
+                      "depth": args.depth, "heavy_hitters": args.heavy_hitters,
+                      "learn_s": learn_s, "edges": graph.num_edges(),
+                      "count_bytes": deep_sizeof(graph.succ) + graph.sketch.memory_usage()}
+            result.update(accuracy(exact.graph, graph))
+            sys.stderr.write("order %d width %7d: %5.1f%% of the exact count memory, "
+                             "coverage %.3f, tv distance %.3f\n"%(
+                                 order, width, 100.0 * result["count_bytes"] / exact_bytes,
+                                 result["coverage"], result["tv_distance"]))
+            results.append(result)
+
+    report = {"corpus": "synthetic-x%d"%args.scale, "chars": len(text), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Time to first sentence of the command line, retraining from the corpus
+(``python -m markogen -f corpus -n 1``) against generating from a model
+compiled beforehand (``python -m markogen generate --model model.bin -n
+1``), for corpora of growing size. Each run is a new interpreter, so the
+times include Python's own startup and the imports. Results are written
+as JSON::
+
+    python -m benchmarks.startup --scales 10 100 -o startup.json
+"""
+import argparse
+import io
+import json
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from . import corpora
+from .run import clock, percentile
+
+SCALES = [10, 100]
+ORDER = 2
+REPEATS = 5
+
+def wall_time(command, cwd):
+    started = clock()
+    with open(os.devnull, "w") as devnull:
+        subprocess.check_call(command, cwd=cwd, stdout=devnull)
+    return clock() - started
+
+def timings(command, cwd, repeats):
+    times = [wall_time(command, cwd) for _ in range(repeats)]
+    return {"min_s": min(times), "median_s": percentile(times, 50)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument( "--scales", type=int, nargs="*", default=SCALES,
+                         help='Synthetic corpus sizes, as multiples of the Tao corpus, '
+                              'default = %s'%" ".join(map(str, SCALES)),)
+    parser.add_argument( "--order", type=int, default=ORDER,
+                         help='Markov order, default = %d'%ORDER,)
+    parser.add_argument( "-r", "--repeats", type=int, default=REPEATS,
+                         help='Runs of each command, default = %d'%REPEATS,)
+    parser.add_argument( "-o", "--output",
+                         help='Write the results to this file instead of stdout',)
+    args = parser.parse_args(argv)
+
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    corpus = [("tao", corpora.tao())] + [("synthetic-x%d"%scale, corpora.synthetic(scale))
+                                         for scale in args.scales]
+    workdir = tempfile.mkdtemp()
+    results = []
+    try:
+        python = [sys.executable, "-m", "markogen"]
+        for name, text in corpus:
+            textfile = os.path.join(workdir, name + ".txt")
+            model = os.path.join(workdir, name + ".bin")
+            with io.open(textfile, "w", encoding="utf-8") as f:
+                f.write(text)
+            started = clock()
+            subprocess.check_call(python + ["compile", "-f", textfile, "-o", model,
+                                            "--order", str(args.order)], cwd=root)
+            result = {"corpus": name, "chars": len(text), "order": args.order,
+                      "compile_s": clock() - started,
+                      "model_bytes": os.path.getsize(model),
+                      "retrain": timings(python + ["-f", textfile, "-o", str(args.order),
+                                                   "-n", "1"], root, args.repeats),
+                      "compiled": timings(python + ["generate", "--model", model,
+                                                    "-n", "1"], root, args.repeats)}
+            sys.stderr.write("%-16s first sentence in %7.3fs retraining, %.3fs from "
+                             "the compiled model\n"%(name, result["retrain"]["median_s"],
+                                                     result["compiled"]["median_s"]))
+            results.append(result)
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {"python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
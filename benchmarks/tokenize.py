@@ -0,0 +1,80 @@
+"""Tokenization throughput: the two-stage path (split the text into
+sentences, then each sentence into tokens) against the single-pass
+``SentenceTokenizer.token_streams``, alone and followed by transition
+counting. Results are written as JSON::
+
+    python -m benchmarks.tokenize --scales 10 100 -o tokenize.json
+"""
+import argparse
+import json
+import sys
+
+from markogen.models import MarkovGraph
+from markogen.tokenizers import SentenceTokenizer
+
+from . import corpora
+from .run import clock
+
+SCALES = [10]
+REPEATS = 3
+
+def two_stage(text, graph):
+    split = graph.tokenizer.split
+    for sentence in SentenceTokenizer().split(text):
+        for _ in split(sentence):
+            pass
+
+def fused(text, graph):
+    for tokens in SentenceTokenizer().token_streams([text], graph.tokenizer):
+        for _ in tokens:
+            pass
+
+def two_stage_counts(text, graph):
+    graph.count_transitions(SentenceTokenizer().split(text))
+
+def fused_counts(text, graph):
+    graph.count_token_transitions(SentenceTokenizer().token_streams([text], graph.tokenizer))
+
+CASES = [two_stage, fused, two_stage_counts, fused_counts]
+
+def best_time(func, text, repeats):
+    best = None
+    for _ in range(repeats):
+        graph = MarkovGraph(order=2)
+        started = clock()
+        func(text, graph)
+        elapsed = clock() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.tokenize")
+    parser.add_argument( "--scales", type=int, nargs="*", default=SCALES,
+                         help='Synthetic corpus sizes, as multiples of the Tao corpus, '
+                              'default = %s'%" ".join(map(str, SCALES)),)
+    parser.add_argument( "-r", "--repeats", type=int, default=REPEATS,
+                         help='Runs per case, the best one is kept, default = %d'%REPEATS,)
+    parser.add_argument( "-o", "--output",
+                         help='Write the results to this file instead of stdout',)
+    args = parser.parse_args(argv)
+
+    corpus = [("tao", corpora.tao())] + [("synthetic-x%d"%scale, corpora.synthetic(scale))
+                                         for scale in args.scales]
+    results = []
+    for name, text in corpus:
+        for case in CASES:
+            seconds = best_time(case, text, args.repeats)
+            sys.stderr.write("%-16s %-17s %8.1f MB/s\n"%(name, case.__name__,
+                                                         len(text) / seconds / 1e6))
+            results.append({"corpus": name, "case": case.__name__, "chars": len(text),
+                            "seconds": seconds, "chars_per_s": len(text) / seconds})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+    else:
+        json.dump({"results": results}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
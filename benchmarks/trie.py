@@ -0,0 +1,63 @@
+"""One ``ContextTrie`` holding the contexts of orders 1 to N against N
+separately trained ``MarkovGraph`` s: training time and memory. Results are
+written as JSON::
+
+    python -m benchmarks.trie --scales 1 10 --max_order 4 -o trie.json
+"""
+import argparse
+import json
+import sys
+
+from markogen.generators import MarkovGenerator, BackoffMarkovGenerator
+
+from . import corpora
+from .run import clock
+
+SCALES = [10]
+MAX_ORDER = 4
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.trie")
+    parser.add_argument( "--scales", type=int, nargs="*", default=SCALES,
+                         help='Synthetic corpus sizes, as multiples of the Tao corpus, '
+                              'default = %s'%" ".join(map(str, SCALES)),)
+    parser.add_argument( "--max_order", type=int, default=MAX_ORDER,
+                         help='Highest order, default = %d'%MAX_ORDER,)
+    parser.add_argument( "-o", "--output",
+                         help='Write the results to this file instead of stdout',)
+    args = parser.parse_args(argv)
+
+    corpus = [("tao", corpora.tao())] + [("synthetic-x%d"%scale, corpora.synthetic(scale))
+                                         for scale in args.scales]
+    results = []
+    for name, text in corpus:
+        graphs_s = graphs_bytes = 0
+        for order in range(1, args.max_order + 1):
+            generator = MarkovGenerator(order)
+            started = clock()
+            generator.learn_bulk(text)
+            graphs_s += clock() - started
+            graphs_bytes += generator.graph.memory_usage()
+            generator = None
+
+        generator = BackoffMarkovGenerator(args.max_order)
+        started = clock()
+        generator.learn(text)
+        trie_s = clock() - started
+        trie_bytes = generator.graph.memory_usage()
+        sys.stderr.write("%-16s orders 1-%d: trie %.2fs %.1fMB, graphs %.2fs %.1fMB\n"%(
+            name, args.max_order, trie_s, trie_bytes / 1e6, graphs_s, graphs_bytes / 1e6))
+        results.append({"corpus": name, "chars": len(text), "max_order": args.max_order,
+                        "trie_learn_s": trie_s, "trie_bytes": trie_bytes,
+                        "graphs_learn_s": graphs_s, "graphs_bytes": graphs_bytes,
+                        "trie": generator.stats()})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+    else:
+        json.dump({"results": results}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
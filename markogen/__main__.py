@@ -2,11 +2,10 @@
 
 import argparse
 import os.path
+import sys
 
-from .models import MarkovGraph
-from .tokenizers import SentenceTokenizer
-from .generators import MarkovGenerator
-
+# modules are imported by the commands using them, so that generating from a
+# compiled model only loads the model storage and the sampler
 def check_if_file_exists(filepath):
     pass
 
@@ -17,25 +16,141 @@ class ExistingFileAction(argparse.Action):
             raise argparse.ArgumentTypeError("cannot find the input file at %s"%filepath)
         setattr(namespace, self.dest, os.path.realpath(filepath))
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument( "-f","--textfile", required=True,
+def add_model_arguments(parser):
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument( "-f","--textfile",
                          help='Input text file', action=ExistingFileAction)
+    source.add_argument( "-l","--load",
+                         help='Model file written by --save', action=ExistingFileAction)
+    parser.add_argument( "-s","--save",
+                         help='Write the trained model to this file',)
     parser.add_argument( "-o", "--order", type=int, default=2,
                          help='Markov order, default = 2',)
+    parser.add_argument( "-m", "--max_len", type=int, default=150,
+                         help='Maximum character per sentence, default = 150',)
+    parser.add_argument( "-j", "--jobs", type=int, default=1,
+                         help='Number of training processes, default = 1',)
+    parser.add_argument( "--max_memory", type=int,
+                         help='Prune the model while training to keep it under '
+                              'this many megabytes',)
+
+def load_generator(args):
+    from .generators import MarkovGenerator
+    if args.load:
+        generator = MarkovGenerator.load(args.load)
+    else:
+        max_memory = args.max_memory * 2**20 if args.max_memory else None
+        generator = MarkovGenerator(args.order, max_memory=max_memory)
+        if args.jobs > 1:
+            generator.learn_parallel([args.textfile], workers=args.jobs)
+        else:
+            generator.learn_file(args.textfile)
+    if args.save:
+        generator.save(args.save)
+    return generator
+
+def serve(argv):
+    parser = argparse.ArgumentParser(prog="markogen serve")
+    add_model_arguments(parser)
+    parser.add_argument( "--host", default="127.0.0.1",
+                         help='Address to listen on, default = 127.0.0.1',)
+    parser.add_argument( "-p", "--port", type=int, default=8642,
+                         help='Port to listen on, default = 8642',)
+    parser.add_argument( "-c", "--concurrency", type=int, default=64,
+                         help='Maximum number of requests in flight, default = 64',)
+    args = parser.parse_args(argv)
+
+    import asyncio
+    import logging
+    from .server import GenerationServer
+    logging.basicConfig(level=logging.INFO)
+    server = GenerationServer(load_generator(args), max_len=args.max_len,
+                              concurrency=args.concurrency)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+def compile_model(argv):
+    parser = argparse.ArgumentParser(prog="markogen compile")
+    parser.add_argument( "-f","--textfile", required=True,
+                         help='Input text file', action=ExistingFileAction)
+    parser.add_argument( "-o","--output", required=True,
+                         help='Write the compiled model to this file',)
+    parser.add_argument( "--order", type=int, default=2,
+                         help='Markov order, default = 2',)
+    parser.add_argument( "-j", "--jobs", type=int, default=1,
+                         help='Number of training processes, default = 1',)
+    parser.add_argument( "--max_memory", type=int,
+                         help='Prune the model while training to keep it under '
+                              'this many megabytes',)
+    args = parser.parse_args(argv)
+    args.load, args.save = None, args.output
+    generator = load_generator(args)
+    stats = generator.stats()
+    sys.stderr.write("%s: %d contexts, %d edges\n"%(args.output, stats["nodes"],
+                                                    stats["edges"]))
+
+def generate(argv):
+    parser = argparse.ArgumentParser(prog="markogen generate")
+    parser.add_argument( "--model", required=True,
+                         help='Model file written by compile', action=ExistingFileAction)
     parser.add_argument( "-n", "--num_sentences", type=int, default=10,
                          help='Number of sentences to be generated, default = 10',)
     parser.add_argument( "-m", "--max_len", type=int, default=150,
                          help='Maximum character per sentence, default = 150',)
-    args = parser.parse_args()
-    with open(args.textfile) as f:
-        data = f.read()
-        generator = MarkovGenerator(args.order)
-        generator.learn(data)
-        count = 0
-        for rep in generator.generate(args.num_sentences, args.max_len):
-            count += 1
-            print("[%d]: %s\n" %(count, rep))
+    parser.add_argument( "--seed", type=int,
+                         help='Seed of the random generator',)
+    args = parser.parse_args(argv)
+
+    from .generators import MarkovGenerator
+    generator = MarkovGenerator.load(args.model, rng=args.seed)
+    print_sentences(generator.generate(args.num_sentences, args.max_len))
+
+def learn(argv):
+    parser = argparse.ArgumentParser(prog="markogen learn")
+    parser.add_argument( "--model", required=True,
+                         help='Model file written by compile', action=ExistingFileAction)
+    parser.add_argument( "-f","--textfile", required=True,
+                         help='Text to add to the model', action=ExistingFileAction)
+    args = parser.parse_args(argv)
+
+    from .generators import MarkovGenerator
+    generator = MarkovGenerator.load(args.model)
+    num_sentences = generator.learn_file(args.textfile)
+    sys.stderr.write("%d sentences journaled, run compact to fold them into "
+                     "%s\n"%(num_sentences, args.model))
+
+def compact(argv):
+    parser = argparse.ArgumentParser(prog="markogen compact")
+    parser.add_argument( "--model", required=True,
+                         help='Model file written by compile', action=ExistingFileAction)
+    args = parser.parse_args(argv)
+
+    from .generators import MarkovGenerator
+    report = MarkovGenerator.load(args.model).compact()
+    sys.stderr.write("%s: folded %d records, %d transitions\n"%(
+        args.model, report["records"], report["transitions"]))
+
+def print_sentences(sentences):
+    for count, rep in enumerate(sentences, 1):
+        print("[%d]: %s\n" %(count, rep))
+
+COMMANDS = {"serve": serve, "compile": compile_model, "generate": generate,
+            "learn": learn, "compact": compact}
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    parser = argparse.ArgumentParser()
+    add_model_arguments(parser)
+    parser.add_argument( "-n", "--num_sentences", type=int, default=10,
+                         help='Number of sentences to be generated, default = 10',)
+    args = parser.parse_args(argv)
+    generator = load_generator(args)
+    print_sentences(generator.generate(args.num_sentences, args.max_len))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,160 @@
+"""Bloom filter of the training sentences, used by ``MarkovGenerator`` to
+reject generated sentences that copy the corpus without keeping its text.
+
+A filter is saved next to its model in a small file of its own::
+
+    header  MAGIC, version, window, number of hashes, of bits and of items
+    bits    the bit array
+"""
+import math
+import struct
+
+try:
+    from hashlib import blake2b
+    def _digest(data):
+        return blake2b(data, digest_size=16).digest()
+except ImportError: # python 2
+    from hashlib import md5
+    def _digest(data):
+        return md5(data).digest()
+
+MAGIC = b"MKBF"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIqIqq")
+CAPACITY = 1 << 20
+ERROR_RATE = 0.001
+SEPARATOR = u"\x1f"
+# number of bits set in each byte value
+POPCOUNT = bytearray(bin(byte).count("1") for byte in range(256))
+
+def item_hashes(data):
+    """Returns the two 64-bit hashes the bit positions of ``data`` (bytes)
+    are derived from
+    """
+    low, high = struct.unpack("<QQ", _digest(data))
+    return low, high | 1
+
+class BloomFilter(object):
+    """``num_bits`` bits, each item setting ``num_hashes`` of them at
+    positions ``h1 + i * h2`` (double hashing). Membership tests may give
+    false positives, never false negatives. The bits set are counted as
+    they are set.
+    """
+    def __init__(self, num_bits, num_hashes, bits=None, count=0):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((num_bits + 7) // 8) if bits is None else bits
+        self.count = count
+        self.set_bits = sum(self.bits.translate(POPCOUNT)) if bits is not None else 0
+
+    @classmethod
+    def for_capacity(cls, capacity=CAPACITY, error_rate=ERROR_RATE):
+        """Returns a filter sized for ``capacity`` items at ``error_rate``"""
+        num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        num_hashes = max(1, int(round(num_bits * 1.0 / capacity * math.log(2))))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, hashes):
+        low, high = hashes
+        num_bits = self.num_bits
+        return [(low + i * high) % num_bits for i in range(self.num_hashes)]
+
+    def add_hashes(self, hashes):
+        bits = self.bits
+        for pos in self._positions(hashes):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                self.set_bits += 1
+        self.count += 1
+
+    def contains_hashes(self, hashes):
+        bits = self.bits
+        return all(bits[pos >> 3] >> (pos & 7) & 1 for pos in self._positions(hashes))
+
+    def add(self, data):
+        self.add_hashes(item_hashes(data))
+
+    def __contains__(self, data):
+        return self.contains_hashes(item_hashes(data))
+
+    def false_positive_rate(self):
+        """Estimated from the share of bits set"""
+        fill = self.set_bits * 1.0 / self.num_bits
+        return fill ** self.num_hashes
+
+    def memory_usage(self):
+        return len(self.bits)
+
+
+class OriginalityFilter(object):
+    """Records the training sentences, or with ``window`` every run of
+    ``window`` consecutive tokens of them (whole sentences when shorter), so
+    that ``copies`` tells whether a sentence repeats one. Checking costs
+    O(length) hashes and no text is kept.
+    """
+    def __init__(self, tokenizer, window=None, capacity=CAPACITY,
+                 error_rate=ERROR_RATE, bloom=None):
+        if window is not None and window < 1:
+            raise Exception("window has to be a strictly positive integer")
+        self.tokenizer = tokenizer
+        self.window = window
+        self.bloom = BloomFilter.for_capacity(capacity, error_rate) if bloom is None else bloom
+
+    @classmethod
+    def window_hashes(cls, tokens, window=None):
+        """Yields the hashes of the sentence given as ``tokens``, or of its
+        windows. Whitespace tokens are left out.
+        """
+        tokens = [token for token in tokens if token.strip()]
+        if window is None or len(tokens) <= window:
+            yield item_hashes(SEPARATOR.join(tokens).encode("utf-8"))
+            return
+        for start in range(len(tokens) - window + 1):
+            yield item_hashes(SEPARATOR.join(tokens[start:start+window]).encode("utf-8"))
+
+    def record_tokens(self, tokens):
+        for hashes in self.window_hashes(tokens, self.window):
+            self.bloom.add_hashes(hashes)
+
+    def record(self, sentence):
+        self.record_tokens(self.tokenizer.split(sentence))
+
+    def record_hashes(self, hashes):
+        for item in hashes:
+            self.bloom.add_hashes(item)
+
+    def copies(self, sentence):
+        """Whether ``sentence`` (or any of its windows) was probably learnt"""
+        contains = self.bloom.contains_hashes
+        return any(contains(hashes) for hashes in
+                   self.window_hashes(self.tokenizer.split(sentence), self.window))
+
+    def stats(self):
+        return {"window": self.window, "items": self.bloom.count,
+                "bytes": self.bloom.memory_usage(), "hashes": self.bloom.num_hashes,
+                "false_positive_rate": self.bloom.false_positive_rate()}
+
+    def save(self, path):
+        bloom = self.bloom
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.window or 0,
+                                bloom.num_hashes, bloom.num_bits, bloom.count))
+            f.write(bloom.bits)
+
+    @classmethod
+    def load(cls, path, tokenizer):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise Exception("%s is not a markogen originality filter"%path)
+        magic, version, window, num_hashes, num_bits, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise Exception("%s is not a markogen originality filter"%path)
+        if version != FORMAT_VERSION:
+            raise Exception("unsupported originality filter version %d"%version)
+        bits = bytearray(data[HEADER.size:])
+        if len(bits) != (num_bits + 7) // 8:
+            raise Exception("truncated originality filter %s"%path)
+        return cls(tokenizer, window or None,
+                   bloom=BloomFilter(num_bits, num_hashes, bits, count))
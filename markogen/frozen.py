@@ -0,0 +1,549 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import heappush, heappop
+from random import random
+import sys
+
+from .tools import deep_sizeof, score_sentences, SMOOTHING
+
+UNREACHABLE = 1 << 62
+
+class FrozenMarkovGraph(object):
+    """Read-only, array-backed copy of a trained ``MarkovGraph``.
+
+    Edges are stored in CSR form: the outgoing edges of node ``i`` are
+    ``targets[offsets[i]:offsets[i+1]]``, sorted by successor id.
+    ``cumulative`` holds the running sum of edge counts over the whole
+    edge array, so each row is a ready-made sampling table, and the
+    ``has_space`` flags are packed eight to a byte in ``spaces``.
+    """
+    START_TOKEN = "[START]"
+    END_TOKEN = "[END]"
+
+    def __init__(self, order, tokens, contexts, offsets, targets,
+                 cumulative, spaces, root, end, end_token_id=1,
+                 tokenizer_cls=None, length_tables=None):
+        self.order = order
+        self.tokens = tokens
+        self.contexts = contexts
+        self.offsets = offsets
+        self.targets = targets
+        self.cumulative = cumulative
+        self.spaces = spaces
+        self.root = root
+        self.end = end
+        self.END_ID = end_token_id
+        self.tokenizer_cls = tokenizer_cls
+        self._length_arrays = length_tables
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Builds the frozen copy of the ``MarkovGraph`` graph"""
+        num_nodes = graph.num_nodes()
+        offsets = array('q', [0])
+        targets = array('i')
+        cumulative = array('q')
+        space_flags = []
+        total = 0
+        for node in range(num_nodes):
+            for succ, packed in sorted(graph.succ[node].items()):
+                total += packed >> 1
+                targets.append(succ)
+                cumulative.append(total)
+                space_flags.append(packed & 1)
+            offsets.append(len(targets))
+
+        spaces = bytearray((len(space_flags) + 7) // 8)
+        for idx, has_space in enumerate(space_flags):
+            if has_space:
+                spaces[idx >> 3] |= 1 << (idx & 7)
+
+        root = graph.toks.get(tuple([graph.START_ID]*graph.order), -1)
+        end = graph.toks.get(tuple([graph.END_ID]*graph.order), -1)
+        return cls(graph.order, list(graph.vocab.tokens), array('i', graph.contexts),
+                   offsets, targets, cumulative, spaces, root, end,
+                   end_token_id=graph.END_ID,
+                   tokenizer_cls=type(graph.tokenizer))
+
+    def thaw(self):
+        """Returns a mutable ``MarkovGraph`` with the same nodes and edges"""
+        from .models import (MarkovGraph, Vocabulary)
+        graph = MarkovGraph(order=self.order)
+        graph.vocab = Vocabulary(self.tokens)
+        if self.tokenizer_cls is not None:
+            graph.tokenizer = self.tokenizer_cls()
+        for node in range(self.num_nodes()):
+            graph._add_context_node(self.node_by_id(node))
+        targets = self.targets
+        for node in range(self.num_nodes()):
+            nbrs = graph.succ[node]
+            for idx in range(self.offsets[node], self.offsets[node+1]):
+                nbrs[targets[idx]] = self._edge_weight(idx) << 1 | self._has_space(idx)
+        graph.edge_total = self.num_edges()
+        graph.transition_total = self.num_edges(unique=False)
+        return graph
+
+    def is_frozen(self):
+        return True
+
+    def freeze(self):
+        return self
+
+    def num_nodes(self):
+        return len(self.offsets) - 1
+
+    def num_edges(self, unique=True):
+        """number of edges in the graph"""
+        if unique:
+            return len(self.targets)
+        return self.cumulative[-1] if len(self.cumulative) else 0
+
+    def stats(self):
+        """Size of the model"""
+        return {"nodes": self.num_nodes(), "edges": self.num_edges(),
+                "transitions": self.num_edges(unique=False),
+                "tokens": len(self.tokens)}
+
+    def _edge_weight(self, idx):
+        if idx:
+            return self.cumulative[idx] - self.cumulative[idx-1]
+        return self.cumulative[0]
+
+    def _has_space(self, idx):
+        return bool(self.spaces[idx >> 3] >> (idx & 7) & 1)
+
+    def _edge_index(self, pred, succ):
+        """Position of the edge in the edge arrays, -1 if there is none"""
+        lo, hi = self.offsets[pred], self.offsets[pred+1]
+        idx = bisect_left(self.targets, succ, lo, hi)
+        if idx < hi and self.targets[idx] == succ:
+            return idx
+        return -1
+
+    def edge_count(self, pred, succ):
+        """get the count property"""
+        idx = self._edge_index(pred, succ)
+        return self._edge_weight(idx) if idx >= 0 else 0
+
+    def get_edge(self, pred, succ):
+        idx = self._edge_index(pred, succ)
+        if idx < 0:
+            raise KeyError((pred, succ))
+        return {"count": self._edge_weight(idx),
+                "has_space": self._has_space(idx)}
+
+    def successors(self, node):
+        return list(self.targets[self.offsets[node]:self.offsets[node+1]])
+
+    def out_edges_iter(self, node, data=True):
+        for idx in range(self.offsets[node], self.offsets[node+1]):
+            if data:
+                yield (node, self.targets[idx],
+                       {"count": self._edge_weight(idx),
+                        "has_space": self._has_space(idx)})
+            else:
+                yield (node, self.targets[idx])
+
+    def _random_edge(self, node, rng=None):
+        lo, hi = self.offsets[node], self.offsets[node+1]
+        if lo == hi:
+            raise Exception("the node %d has no successor"%node)
+        cumulative = self.cumulative
+        base = cumulative[lo-1] if lo else 0
+        random_val = random() if rng is None else rng.random()
+        target = base + int(random_val * (cumulative[hi-1] - base))
+        return bisect_right(cumulative, target, lo, hi)
+
+    def random_step(self, node, rng=None):
+        idx = self._random_edge(node, rng)
+        return self.targets[idx], self._edge_weight(idx)
+
+    def _length_tables(self):
+        """Returns ``(min_chars, needs, row_needs)``, built on first use:
+        the least number of characters rendered on the way from each node to
+        the end node, the same through each edge (the characters the edge
+        renders plus ``min_chars`` of its target) and the largest edge need
+        of each node.
+        """
+        if getattr(self, "_length_arrays", None) is None:
+            num_nodes, num_edges = self.num_nodes(), self.num_edges()
+            rendered = set([self.END_ID])
+            if self.root >= 0:
+                rendered.add(self.last_token_id(self.root))
+            lengths = [0 if self.last_token_id(node) in rendered \
+                       else len(self.tokens[self.last_token_id(node)])
+                       for node in range(num_nodes)]
+            costs = array('q', [0]) * num_edges
+            incoming = [[] for _ in range(num_nodes)]
+            for node in range(num_nodes):
+                for idx in range(self.offsets[node], self.offsets[node+1]):
+                    if lengths[node]:
+                        costs[idx] = lengths[node] + self._has_space(idx)
+                    incoming[self.targets[idx]].append((node, idx))
+
+            # dijkstra from the end node, walking the edges backwards
+            min_chars = array('q', [UNREACHABLE]) * num_nodes
+            if self.end >= 0:
+                min_chars[self.end] = 0
+                heap = [(0, self.end)]
+                while heap:
+                    dist, node = heappop(heap)
+                    if dist > min_chars[node]:
+                        continue
+                    for pred, idx in incoming[node]:
+                        if dist + costs[idx] < min_chars[pred]:
+                            min_chars[pred] = dist + costs[idx]
+                            heappush(heap, (min_chars[pred], pred))
+
+            needs = array('q', (costs[idx] + min_chars[self.targets[idx]] \
+                                for idx in range(num_edges)))
+            row_needs = array('q', (max(needs[self.offsets[node]:self.offsets[node+1]] or [0])
+                                    for node in range(num_nodes)))
+            self._length_arrays = (min_chars, needs, row_needs)
+        return self._length_arrays
+
+    def _bounded_edge(self, node, budget, rng=None):
+        """Same as ``_random_edge`` among the edges that can still reach the
+        end node within ``budget`` characters"""
+        _, needs, row_needs = self._length_tables()
+        if row_needs[node] <= budget:
+            return self._random_edge(node, rng)
+        lo, hi = self.offsets[node], self.offsets[node+1]
+        total = sum(self._edge_weight(idx) for idx in range(lo, hi) if needs[idx] <= budget)
+        if not total:
+            raise Exception("no edge of node %d fits in %d characters"%(node, budget))
+        target = int((random() if rng is None else rng.random()) * total)
+        for idx in range(lo, hi):
+            if needs[idx] <= budget:
+                weight = self._edge_weight(idx)
+                if target < weight:
+                    return idx
+                target -= weight
+
+    def _walk_edges(self, start_node, end_node, max_len=None, rng=None):
+        """Yields the ``(node, edge index)`` steps of a random walk from
+        ``start_node`` to ``end_node``. With ``max_len``, only the edges from
+        which the end can be reached while keeping the rendered sentence
+        under ``max_len`` characters are taken, so the walk never has to be
+        rejected; nothing is yielded if no such walk exists. ``rng`` is the
+        random generator to draw from (``random.Random``, NumPy ``Generator``),
+        the ``random`` module by default.
+        """
+        curr = start_node
+        if max_len is None:
+            while curr != end_node:
+                idx = self._random_edge(curr, rng)
+                yield curr, idx
+                curr = self.targets[idx]
+            return
+
+        min_chars, needs, _ = self._length_tables()
+        budget = max_len - 1
+        if min_chars[start_node] > budget:
+            return
+        while curr != end_node:
+            idx = self._bounded_edge(curr, budget, rng)
+            yield curr, idx
+            curr = self.targets[idx]
+            budget -= needs[idx] - min_chars[curr]
+
+    def random_walk(self, start_node, end_node, max_len=None, rng=None):
+        """Yields one random path from ``start_node`` to ``end_node``, see
+        ``_walk_edges`` for ``max_len`` and ``rng``.
+        """
+        targets = self.targets
+        walk = self._walk_edges(start_node, end_node, max_len, rng)
+        path = [targets[idx] for _, idx in walk]
+        if path:
+            yield tuple(path)
+
+    def iter_tokens(self, start_node, end_node, max_len=None, rng=None):
+        """Yields the rendered fragments (a token and its trailing space) of
+        a random walk as each step is taken.
+        """
+        tokens, END_ID = self.tokens, self.END_ID
+        for node, idx in self._walk_edges(start_node, end_node, max_len, rng):
+            if node == self.root:
+                continue
+            token_id = self.last_token_id(node)
+            if token_id != END_ID:
+                yield tokens[token_id] + " " if self._has_space(idx) else tokens[token_id]
+
+    def token_id(self, token, default=None):
+        """Returns the id of ``token``, ``default`` if it was never learnt"""
+        if getattr(self, "_token_ids", None) is None:
+            self._token_ids = {token: token_id for token_id, token in enumerate(self.tokens)}
+        return self._token_ids.get(token, default)
+
+    def context_node(self, key):
+        """Returns the node of the context ``key`` (a tuple of token ids),
+        -1 if there is none. The lookup table is built on first use.
+        """
+        if getattr(self, "_context_ids", None) is None:
+            order, contexts = self.order, self.contexts
+            self._context_ids = {tuple(contexts[node*order:(node+1)*order]): node
+                                 for node in range(self.num_nodes())}
+        return self._context_ids.get(key, -1)
+
+    def out_count(self, node):
+        """Number of transitions learnt out of ``node``"""
+        lo, hi = self.offsets[node], self.offsets[node+1]
+        if lo == hi:
+            return 0
+        return self.cumulative[hi-1] - (self.cumulative[lo-1] if lo else 0)
+
+    def score(self, sentences, smoothing=SMOOTHING):
+        """Same as ``MarkovGraph.score``"""
+        from .models import MarkovGraph
+        tokenizer = (self.tokenizer_cls or MarkovGraph.tokenizer_cls)()
+        head, tail = [self.START_TOKEN]*self.order, [self.END_TOKEN]*self.order
+        lookup = lambda token: self.token_id(token, -1)
+        def transition_keys(sentence):
+            tokens = head + tokenizer.split(sentence) + tail
+            return MarkovGraph._transition_keys(
+                MarkovGraph._contexts_by_tokens(tokens, self.order, lookup), self.END_ID)
+        def transition_counts(key):
+            node = self.context_node(key[0])
+            if node < 0:
+                return 0, 0
+            succ = self.context_node(key[1])
+            return (self.edge_count(node, succ) if succ >= 0 else 0), self.out_count(node)
+        return score_sentences(sentences, transition_keys, transition_counts,
+                               smoothing, len(self.tokens))
+
+    def _token_index(self):
+        """Returns ``(token_offsets, token_nodes)``, built on first use: the
+        nodes whose context ends with token ``t`` are
+        ``token_nodes[token_offsets[t]:token_offsets[t+1]]``.
+        """
+        if getattr(self, "_token_arrays", None) is None:
+            num_nodes = self.num_nodes()
+            token_offsets = array('q', [0]) * (len(self.tokens) + 1)
+            for node in range(num_nodes):
+                token_offsets[self.last_token_id(node) + 1] += 1
+            for token_id in range(len(self.tokens)):
+                token_offsets[token_id + 1] += token_offsets[token_id]
+            token_nodes = array('i', [0]) * num_nodes
+            filled = array('q', token_offsets)
+            for node in range(num_nodes):
+                token_id = self.last_token_id(node)
+                token_nodes[filled[token_id]] = node
+                filled[token_id] += 1
+            self._token_arrays = (token_offsets, token_nodes)
+        return self._token_arrays
+
+    def nodes_ending_with(self, token_ids):
+        """Returns the nodes whose context ends with the ``token_ids``
+        (at most ``order`` of them)
+        """
+        size = len(token_ids)
+        if not 0 < size <= self.order:
+            raise Exception("a context ends with 1 to %d tokens"%self.order)
+        token_offsets, token_nodes = self._token_index()
+        token_id = token_ids[-1]
+        if not 0 <= token_id < len(self.tokens):
+            return []
+        nodes = token_nodes[token_offsets[token_id]:token_offsets[token_id+1]]
+        if size == 1:
+            return list(nodes)
+        token_ids, order = tuple(token_ids), self.order
+        return [node for node in nodes if
+                tuple(self.contexts[(node+1)*order-size:(node+1)*order]) == token_ids]
+
+    def _predecessor_arrays(self):
+        """Returns the edges in reverse CSR form, built on first use:
+        ``(pred_offsets, pred_sources, pred_cumulative)``, the running sum of
+        the edge counts making each row a sampling table of the
+        predecessors of a node.
+        """
+        if getattr(self, "_pred_arrays", None) is None:
+            num_nodes, num_edges = self.num_nodes(), self.num_edges()
+            targets = self.targets
+            pred_offsets = array('q', [0]) * (num_nodes + 1)
+            for idx in range(num_edges):
+                pred_offsets[targets[idx] + 1] += 1
+            for node in range(num_nodes):
+                pred_offsets[node + 1] += pred_offsets[node]
+            pred_sources = array('i', [0]) * num_edges
+            weights = array('q', [0]) * num_edges
+            filled = array('q', pred_offsets)
+            for node in range(num_nodes):
+                for idx in range(self.offsets[node], self.offsets[node+1]):
+                    pos = filled[targets[idx]]
+                    pred_sources[pos] = node
+                    weights[pos] = self._edge_weight(idx)
+                    filled[targets[idx]] += 1
+            total = 0
+            for pos in range(num_edges):
+                total += weights[pos]
+                weights[pos] = total
+            self._pred_arrays = (pred_offsets, pred_sources, weights)
+        return self._pred_arrays
+
+    def in_count(self, node):
+        """Number of transitions learnt into ``node``"""
+        pred_offsets, _, pred_cumulative = self._predecessor_arrays()
+        lo, hi = pred_offsets[node], pred_offsets[node+1]
+        if lo == hi:
+            return 0
+        return pred_cumulative[hi-1] - (pred_cumulative[lo-1] if lo else 0)
+
+    def random_path_to(self, node, rng=None):
+        """Returns a random path from the root node to ``node``, drawn
+        backwards: each predecessor in proportion to the number of times
+        its edge was learnt, which is how often it came before. The root is
+        left out, as in ``random_walk``.
+        """
+        pred_offsets, pred_sources, pred_cumulative = self._predecessor_arrays()
+        path = [node]
+        while node != self.root:
+            lo, hi = pred_offsets[node], pred_offsets[node+1]
+            if lo == hi:
+                raise Exception("the node %d cannot be reached from the root"%node)
+            base = pred_cumulative[lo-1] if lo else 0
+            random_val = random() if rng is None else rng.random()
+            target = base + int(random_val * (pred_cumulative[hi-1] - base))
+            node = pred_sources[bisect_right(pred_cumulative, target, lo, hi)]
+            path.append(node)
+        path.pop()
+        path.reverse()
+        return path
+
+    def path_from_root(self, token_ids):
+        """Returns the nodes a walk from the root goes through to render
+        ``token_ids`` first, root left out, or None if no walk does.
+        """
+        if self.root < 0:
+            return None
+        ids = list(self.node_by_id(self.root)) + list(token_ids)
+        path, prev = [], self.root
+        for start in range(1, len(token_ids) + 1):
+            key = ids[start:start+self.order]
+            nodes = self.nodes_ending_with(key)
+            if not nodes or self._edge_index(prev, nodes[0]) < 0:
+                return None
+            prev = nodes[0]
+            path.append(prev)
+        return path
+
+    def root_node_id(self,):
+        if self.root < 0:
+            raise Exception("No node with such tokens footprint")
+        return self.root
+
+    def end_node_id(self,):
+        if self.end < 0:
+            raise Exception("No node with such tokens footprint")
+        return self.end
+
+    def node_by_id(self, node_id):
+        """Returns the token ids of the node context"""
+        start = node_id*self.order
+        return tuple(self.contexts[start:start+self.order])
+
+    def node_tokens(self, node_id):
+        """Returns the tokens of the node context"""
+        return tuple(self.tokens[token_id] for token_id in self.node_by_id(node_id))
+
+    def last_token_id(self, node_id):
+        return self.contexts[node_id*self.order + self.order - 1]
+
+    def memory_usage(self):
+        """Approximate number of bytes held by the graph structures"""
+        arrays = (self.contexts, self.offsets, self.targets,
+                  self.cumulative, self.spaces)
+        return sum(sys.getsizeof(arr) for arr in arrays) + deep_sizeof(self.tokens)
+
+    def _numpy_arrays(self):
+        """NumPy views of the edge arrays and per-node render lengths used
+        by ``generate_batch``, built on first use.
+        """
+        if getattr(self, "_np_arrays", None) is None:
+            import numpy as np
+            offsets = np.frombuffer(self.offsets, dtype=np.int64)
+            cumulative = np.frombuffer(self.cumulative, dtype=np.int64)
+            padded = np.concatenate(([0], cumulative))
+            base = padded[offsets[:-1]]
+            totals = padded[offsets[1:]] - base
+            targets = np.frombuffer(self.targets, dtype=np.intc)
+            spaces = np.unpackbits(np.frombuffer(self.spaces, dtype=np.uint8),
+                                   bitorder="little")[:len(targets)]
+            lengths = np.array([0 if self.last_token_id(node) == self.END_ID \
+                                else len(self.tokens[self.last_token_id(node)])
+                                for node in range(self.num_nodes())], dtype=np.int64)
+            if self.root >= 0:
+                lengths[self.root] = 0
+            last_tokens = np.frombuffer(self.contexts, dtype=np.intc)\
+                            [self.order-1::self.order].astype(np.int64)
+            pieces = np.empty(2*len(self.tokens), dtype=object)
+            pieces[0::2] = list(self.tokens)
+            pieces[1::2] = [token + " " for token in self.tokens]
+            self._np_arrays = (base, totals, cumulative, targets,
+                               spaces.astype(np.int64), lengths,
+                               last_tokens, pieces)
+        return self._np_arrays
+
+    def generate_batch(self, n, max_len=None, seed=None, max_attempts=None):
+        """Generates ``n`` sentences of less than ``max_len`` characters
+        by advancing ``n`` walkers in lockstep with NumPy: every step is one
+        vectorized draw and ``searchsorted`` over ``cumulative``. Walkers
+        that reach the end node stop, walkers that get too long start over,
+        and sentences are rendered once all walks are done. Gives up after
+        ``max_attempts * n`` restarts. Requires numpy.
+        """
+        import numpy as np
+        base, totals, cumulative, targets, spaces, lengths, last_tokens, pieces = \
+            self._numpy_arrays()
+        start, end = self.root_node_id(), self.end_node_id()
+        rng = np.random.default_rng(seed)
+        if max_len is not None and self._length_tables()[0][start] >= max_len:
+            raise Exception("no sentence is shorter than %d characters"%max_len)
+        restarts = 0
+
+        curr = np.full(n, start, dtype=np.int64)
+        length = np.zeros(n, dtype=np.int64)
+        pos = np.zeros(n, dtype=np.int64)
+        trace = np.zeros((n, 32), dtype=np.int64)
+        walking = np.arange(n)
+        while walking.size:
+            nodes = curr[walking]
+            draws = base[nodes] + (rng.random(walking.size) * totals[nodes]).astype(np.int64)
+            edges = np.searchsorted(cumulative, draws, side="right")
+            if pos.max() >= trace.shape[1]:
+                trace = np.concatenate((trace, np.zeros_like(trace)), axis=1)
+            trace[walking, pos[walking]] = edges
+            pos[walking] += 1
+            length[walking] += np.where(nodes == start, 0, lengths[nodes] + spaces[edges])
+            curr[walking] = targets[edges]
+
+            if max_len is not None:
+                over = walking[length[walking] >= max_len]
+                curr[over], length[over], pos[over] = start, 0, 0
+                restarts += over.size
+                if max_attempts is not None and restarts > max_attempts * n:
+                    raise Exception("could not generate %d sentences shorter than "
+                                    "%d characters"%(n, max_len))
+            walking = walking[curr[walking] != end]
+
+        # each step after the first renders the last token of the node it
+        # left, followed by a space if the edge taken has one
+        width = int(pos.max())
+        trace = trace[:, :width]
+        tokens = last_tokens[targets[trace[:, :-1]]]
+        codes = 2*tokens + spaces[trace[:, 1:]]
+        rendered = (np.arange(width - 1) < (pos - 1)[:, None]) & (tokens != self.END_ID)
+        return ["".join(pieces[codes[slot][rendered[slot]]].tolist()) for slot in range(n)]
+
+    def _path_to_edges(self, path):
+        tokens = self.tokens
+        for pred, succ in zip(path[:-1], path[1:]):
+            ptoken = self.last_token_id(pred)
+            stoken = self.last_token_id(succ)
+            if ptoken != self.END_ID or stoken != self.END_ID:
+                yield tokens[ptoken], tokens[stoken],\
+                    self._has_space(self._edge_index(pred, succ))
+
+    def _path_to_string(self, path):
+        edges = self._path_to_edges(path)
+        return "".join(token+" " if has_space else token for \
+                     token, _, has_space in edges)
@@ -1,29 +1,512 @@
 
-from itertools import count
+import io
+import math
+import os
+import random
+from itertools import count, chain
 from sys import maxsize as MAX_INT
 
+import six
+
 from .models import (MarkovGraph,)
+from .frozen import (FrozenMarkovGraph, UNREACHABLE)
 from .tokenizers import (SentenceTokenizer,)
+from .tools import batches, make_rng, cumulative_table, cumulative_choice, SMOOTHING
+from . import storage
+from . import tokenizers
+
+CHUNK_SIZE = 1 << 20
+BATCH_SIZE = 2000
+MAX_ATTEMPTS = 1000
+# with a memory budget, the graph is pruned when its estimated size goes
+# above HIGH_WATER of the budget, until it is below LOW_WATER
+HIGH_WATER = 0.9
+LOW_WATER = 0.7
+# times a context has to be seen for backoff generation to use it
+MIN_SUPPORT = 2
+# the originality filter of a saved model is written to its path plus this
+ORIGINALITY_SUFFIX = ".originality"
+# and the journal of the counts learnt since, to this
+JOURNAL_SUFFIX = ".delta"
+
+def _count_shard(args):
+    """Worker of ``MarkovGenerator.learn_parallel``. With ``record``, also
+    returns the originality hashes of the sentences.
+    """
+    order, tokenizer_cls, sentences, record, window = args
+    graph = MarkovGraph(order=order)
+    graph.tokenizer = tokenizer_cls()
+    hashes = []
+    if record:
+        from .bloom import OriginalityFilter
+        split = graph.tokenizer.split
+        tokenized = [split(sentence) for sentence in sentences]
+        for tokens in tokenized:
+            hashes.extend(OriginalityFilter.window_hashes(tokens, window))
+        counts = graph.count_token_transitions(tokenized)
+    else:
+        counts = graph.count_transitions(sentences)
+    return len(sentences), graph.vocab.tokens, counts, hashes
 
 class MarkovGenerator(object):
     """"""
     set_tokenizer_cls = SentenceTokenizer
 
-    def __init__(self, order):
-        """"""
-        self.graph = MarkovGraph(order=order)
+    def __init__(self, order, rng=None, max_memory=None, originality=None,
+                 originality_capacity=None, originality_error_rate=None):
+        """``rng`` is the random generator sentences are drawn from: a
+        ``random.Random``, a NumPy ``Generator`` or a seed for a new
+        ``random.Random``.
+
+        With ``max_memory`` (in bytes), the graph is pruned while learning
+        whenever it gets close to that size: transitions seen less than a
+        threshold are dropped, the threshold doubling until the graph is
+        small enough. ``pruning_report`` tells how much was kept.
+
+        With ``originality``, the sentences learnt are recorded in an
+        ``OriginalityFilter`` and ``generate`` draws again the sentences
+        that copy one: ``True`` rejects whole sentences, a number n any n
+        consecutive tokens of a sentence (n has to be above ``order + 1``,
+        shorter runs always come from the corpus), or an
+        ``OriginalityFilter``. The filter is sized for
+        ``originality_capacity`` items (sentences, or windows: about one per
+        token of the corpus) at ``originality_error_rate`` false positives,
+        ``bloom.CAPACITY`` and ``bloom.ERROR_RATE`` by default. Past its
+        capacity, the false positive rate (in ``stats``) grows and more and
+        more original sentences are taken for copies, until ``generate``
+        gives up.
+        """
+        self._init_state(MarkovGraph(order=order), rng, max_memory)
+        if originality is not None and originality is not False:
+            from .bloom import (OriginalityFilter, CAPACITY, ERROR_RATE)
+            if isinstance(originality, OriginalityFilter):
+                window = originality.window
+            else:
+                window = None if originality is True else originality
+            if window is not None and window <= order + 1:
+                raise Exception("originality windows have to be longer than "
+                                "order + 1 tokens")
+            if isinstance(originality, OriginalityFilter):
+                self.originality = originality
+            else:
+                self.originality = OriginalityFilter(
+                    self.graph.tokenizer, window,
+                    CAPACITY if originality_capacity is None else originality_capacity,
+                    ERROR_RATE if originality_error_rate is None else originality_error_rate)
+
+    def _init_state(self, graph, rng=None, max_memory=None):
+        """Sets up a generator of ``graph``, for ``__init__`` and ``load``"""
+        self.pending_counts = []
+        self.graph = graph
         self.set_tokenizer = self.set_tokenizer_cls()
+        self.rng = make_rng(rng)
+        self.instruments = None
+        self.max_memory = max_memory
+        self.pruning_report = None
+        self.path = self.journal = None
+        self.originality = None
 
     def learn(self, text):
         """Update the markov chain from the text. Learning is done\
         sentence by sentence. Returns the number of sentences learnt.
         """
+        return self._learn_sentences(self.set_tokenizer.split(text))
+
+    def learn_bulk(self, text):
+        """Same as ``learn``, but count the transitions of ``BATCH_SIZE``
+        sentences at a time and fold the counts into the graph, instead of
+        updating the graph edge by edge. Sentences and tokens are matched in
+        the same pass over the text. Returns the number of sentences learnt.
+        """
+        num_sentences = [0]
+        # the journal records the sentences along with their counts
+        originality = self.originality if self.journal is None else None
+        def token_streams(tokenizer):
+            for tokens in self.set_tokenizer.token_streams([text], tokenizer):
+                num_sentences[0] += 1
+                if originality is not None:
+                    originality.record_tokens(tokens)
+                yield tokens
+        if self.journal is not None:
+            self._journal_token_streams(token_streams(self._tokenizer_cls()()))
+            return num_sentences[0]
+        graph = self._mutable_graph()
+        for batch in batches(token_streams(graph.tokenizer), BATCH_SIZE):
+            graph.add_transition_counts(graph.count_token_transitions(batch))
+            if self.max_memory is not None:
+                self._check_memory()
+        return num_sentences[0]
+
+    def learn_stream(self, chunks):
+        """Same as ``learn`` for an iterable of text chunks. Sentences cut
+        by a chunk boundary are carried over to the next chunk, so the
+        whole text is never held in memory. Returns the number of sentences
+        learnt.
+        """
+        return self._learn_sentences(self.set_tokenizer.split_stream(chunks))
+
+    def learn_file(self, path, chunk_size=CHUNK_SIZE, encoding="utf-8"):
+        """Learn from the text file at ``path``, read ``chunk_size``
+        characters at a time. Returns the number of sentences learnt.
+        """
+        return self.learn_stream(self._read_chunks(path, chunk_size, encoding))
+
+    def learn_parallel(self, paths_or_text, workers=None, batch_size=BATCH_SIZE):
+        """Learn with a pool of ``workers`` processes (default: one per cpu).
+        ``paths_or_text`` is either the text itself or a list of text files.
+        Sentences are sent to the workers in batches of ``batch_size``; each
+        worker counts the transitions of its batch and the counts are merged
+        in corpus order, which gives the same model as ``learn``. Returns
+        the number of sentences learnt.
+        """
+        if isinstance(paths_or_text, six.string_types):
+            sentences = self.set_tokenizer.split_stream([paths_or_text])
+        else:
+            sentences = chain.from_iterable(
+                self.set_tokenizer.split_stream(self._read_chunks(path))
+                for path in paths_or_text)
+        originality = self.originality
+        record = originality is not None
+        window = originality.window if record else None
+        shards = ((self._graph.order, self._tokenizer_cls(), batch, record, window)
+                  for batch in batches(sentences, batch_size))
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        try:
+            count = 0
+            for num_sentences, tokens, counts, hashes in pool.imap(_count_shard, shards):
+                count += num_sentences
+                self._add_counts(counts, tokens, hashes)
+                if record:
+                    originality.record_hashes(hashes)
+                if self.max_memory is not None:
+                    self._check_memory()
+        finally:
+            pool.terminate()
+        return count
+
+    @classmethod
+    def _read_chunks(cls, path, chunk_size=CHUNK_SIZE, encoding="utf-8"):
+        with io.open(path, encoding=encoding) as f:
+            for chunk in iter(lambda: f.read(chunk_size), u""):
+                yield chunk
+
+    @property
+    def graph(self):
+        """The graph of the model, with the journaled counts kept aside
+        folded in
+        """
+        if self.pending_counts:
+            self._mutable_graph()
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+
+    def _mutable_graph(self):
+        pending, self.pending_counts = self.pending_counts, []
+        if isinstance(self._graph, FrozenMarkovGraph):
+            self._graph = self._thawed_graph()
+            if self.instruments is not None:
+                self._attach_instruments()
+        for counts, tokens in pending:
+            self._graph.add_transition_counts(counts, tokens)
+        return self._graph
+
+    def _tokenizer_cls(self):
+        graph = self._graph
+        if isinstance(graph, FrozenMarkovGraph):
+            return graph.tokenizer_cls or MarkovGraph.tokenizer_cls
+        return type(graph.tokenizer)
+
+    def _add_counts(self, counts, tokens=None, hashes=()):
+        """Adds transition counts to the model. A loaded model appends them
+        to its journal, with the originality ``hashes`` of their sentences,
+        and keeps them aside until the graph is needed, so learning does not
+        thaw it.
+        """
+        if self.journal is None:
+            self._mutable_graph().add_transition_counts(counts, tokens)
+            return
+        self.journal.append(counts, tokens, hashes)
+        if isinstance(self._graph, FrozenMarkovGraph):
+            self.pending_counts.append((counts, tokens))
+        else:
+            self._graph.add_transition_counts(counts, tokens)
+
+    def _journal_token_streams(self, token_streams):
+        """Counts ``BATCH_SIZE`` sentences at a time apart from the graph,
+        so that the counts only refer to the tokens of their batch, and adds
+        them, recording the sentences in the originality filter. Returns the
+        number of sentences.
+        """
+        originality = self.originality
         count = 0
-        for sentence in self.set_tokenizer.split(text):
-            count += 1
-            self.graph.update_by_sentence(sentence)
+        for batch in batches(token_streams, BATCH_SIZE):
+            counter = MarkovGraph(order=self._graph.order)
+            counts = counter.count_token_transitions(batch)
+            hashes = []
+            if originality is not None:
+                for tokens in batch:
+                    hashes.extend(originality.window_hashes(tokens, originality.window))
+            self._add_counts(counts, counter.vocab.tokens, hashes)
+            if originality is not None:
+                originality.record_hashes(hashes)
+            count += len(batch)
         return count
 
+    def _thawed_graph(self):
+        """The graph to learn on once the model has been compiled"""
+        return self.graph.thaw()
+
+    def _frozen_graph(self):
+        """The compiled copy of the trained graph"""
+        return FrozenMarkovGraph.from_graph(self.graph)
+
+    def _learn_sentences(self, sentences):
+        if self.journal is not None:
+            split = self._tokenizer_cls()().split
+            return self._journal_token_streams(six.moves.map(split, sentences))
+        if self.originality is not None:
+            sentences = self._recorded(sentences)
+        graph = self._mutable_graph()
+        count = 0
+        if self.max_memory is None:
+            for sentence in sentences:
+                count += 1
+                graph.update_by_sentence(sentence)
+            return count
+        for batch in batches(sentences, BATCH_SIZE):
+            for sentence in batch:
+                graph.update_by_sentence(sentence)
+            count += len(batch)
+            self._check_memory()
+        return count
+
+    def _recorded(self, sentences):
+        record = self.originality.record
+        for sentence in sentences:
+            record(sentence)
+            yield sentence
+
+    def prune(self, min_count):
+        """Drops the transitions seen less than ``min_count`` times and the
+        contexts left unreachable, see ``MarkovGraph.prune``. Returns the
+        model size before and after, and the fraction kept.
+        """
+        return self._mutable_graph().prune(min_count)
+
+    def _check_memory(self):
+        """Prunes the graph if it is getting close to ``max_memory``, the
+        pruning threshold doubling until the graph is small enough. Every
+        context keeps its most frequent transition, so the model may stay
+        over budget (``over_budget`` in the report) when that is all left.
+
+        The size is estimated from the node, edge and token counts, scaled
+        by the ratio to the measured size the last time it was measured.
+        """
+        graph = self.graph
+        if not graph.transition_total:
+            return # nothing to prune
+        report = self.pruning_report
+        scale = report["memory_scale"] if report is not None else 1.0
+        if graph.estimated_memory() * scale < self.max_memory * HIGH_WATER:
+            return
+        if report is None:
+            report = self.pruning_report = {"max_memory": self.max_memory, "prunes": 0,
+                                            "min_count": 2, "dropped_transitions": 0,
+                                            "memory_scale": 1.0}
+        def measure():
+            memory = graph.memory_usage()
+            report["memory_scale"] = memory * 1.0 / max(1, graph.estimated_memory())
+            return memory
+
+        memory = measure()
+        if memory >= self.max_memory * HIGH_WATER:
+            max_count = max(packed >> 1 for nbrs in graph.succ for packed in six.itervalues(nbrs))
+            while True:
+                pruned = graph.prune(report["min_count"])
+                report["prunes"] += 1
+                report["dropped_transitions"] += (pruned["before"]["transitions"] -
+                                                  pruned["after"]["transitions"])
+                memory = measure()
+                if memory < self.max_memory * LOW_WATER:
+                    break
+                if pruned["after"] == pruned["before"] and report["min_count"] > max_count:
+                    break
+                report["min_count"] *= 2
+        learnt = graph.transition_total + report["dropped_transitions"]
+        report["kept_transitions"] = graph.transition_total * 1.0 / learnt
+        report["memory"] = memory
+        report["over_budget"] = memory >= self.max_memory
+
+    def score(self, sentences, smoothing=SMOOTHING):
+        """Returns the natural log-probability of each of ``sentences``
+        under the model, with additive ``smoothing`` of the transitions (0
+        gives -inf to sentences taking an unseen one), see
+        ``MarkovGraph.score``.
+        """
+        return [log_prob for log_prob, _ in self.graph.score(sentences, smoothing)]
+
+    def perplexity(self, text, smoothing=SMOOTHING):
+        """Per-token perplexity of the model on the sentences of ``text``
+        (the end of each sentence counting as a token): the exponential of
+        the negated mean transition log-probability.
+        """
+        log_prob, num_transitions = 0.0, 0
+        for sentence_log_prob, transitions in self.graph.score(
+                self.set_tokenizer.split_stream([text]), smoothing):
+            log_prob += sentence_log_prob
+            num_transitions += transitions
+        if not num_transitions:
+            raise Exception("no sentence to evaluate the model on")
+        return math.exp(-log_prob / num_transitions)
+
+    def instrument(self, enabled=True):
+        """Start collecting per-phase timers (sentence split, token split,
+        graph update, walk, render), walk lengths and generation counts,
+        reported by ``stats``. ``instrument(False)`` stops and discards
+        them. Uninstrumented generators pay nothing for it.
+        """
+        if enabled:
+            from .instruments import Instruments
+            self.instruments = Instruments()
+            self._attach_instruments()
+        else:
+            self.instruments = None
+            self._detach_instruments()
+
+    def stats(self):
+        """Node, edge, transition and token counts of the model, plus the
+        collected timers and counters when instrumented.
+        """
+        stats = self.graph.stats()
+        if self.instruments is not None:
+            stats.update(self.instruments.report())
+        if self.pruning_report is not None:
+            stats["pruning"] = dict(self.pruning_report)
+        if self.originality is not None:
+            stats["originality"] = self.originality.stats()
+        if self.journal is not None:
+            stats["journal"] = self.journal.stats()
+        return stats
+
+    def _instrumented(self):
+        """Yields ``(object, method name, phase, wrapper name)`` for the
+        methods that are timed
+        """
+        yield self.set_tokenizer, "split", "sentence_split", "timed"
+        yield self.set_tokenizer, "split_stream", "sentence_split", "timed_iter"
+        yield self.set_tokenizer, "token_streams", "sentence_split", "timed_iter"
+        if not isinstance(self.graph, FrozenMarkovGraph):
+            yield self.graph.tokenizer, "split", "token_split", "timed"
+            for name in ("update_by_sentence", "count_transitions",
+                         "count_token_transitions", "add_transition_counts"):
+                yield self.graph, name, "graph_update", "timed"
+
+    def _attach_instruments(self):
+        for obj, name, phase, wrapper in self._instrumented():
+            # always wrap the class method, so attaching twice is harmless
+            method = getattr(type(obj), name).__get__(obj, type(obj))
+            setattr(obj, name, getattr(self.instruments, wrapper)(phase, method))
+        self._walk_phrase = self._instrumented_walk_phrase()
+
+    def _detach_instruments(self):
+        for obj, name, _, _ in self._instrumented():
+            obj.__dict__.pop(name, None)
+        self.__dict__.pop("_walk_phrase", None)
+
+    def compile(self):
+        """Replace the trained graph by its compact read-only
+        ``FrozenMarkovGraph`` copy. Learning again thaws it. Returns the
+        approximate memory used by the graph before and after conversion.
+        """
+        before = self.graph.memory_usage()
+        self._compiled_graph()
+        return {"before": before, "after": self.graph.memory_usage()}
+
+    def _compiled_graph(self):
+        """Same as ``compile`` without measuring the graph, for the
+        generation paths: a no-op once the model is compiled
+        """
+        if not isinstance(self.graph, FrozenMarkovGraph):
+            self.graph = self._frozen_graph()
+        return self.graph
+
+    def save(self, path):
+        """Write the model to ``path`` in the binary format of ``storage``,
+        and its originality filter, if any, next to it. A journal of the
+        model previously at ``path`` is emptied, its counts being saved.
+        """
+        graph = self.graph
+        if not isinstance(graph, FrozenMarkovGraph):
+            graph = self._frozen_graph()
+        storage.dump(graph, path, type(self.set_tokenizer))
+        if self.originality is not None:
+            self.originality.save(path + ORIGINALITY_SUFFIX)
+        elif os.path.exists(path + ORIGINALITY_SUFFIX):
+            os.remove(path + ORIGINALITY_SUFFIX)
+        journal_path = os.path.abspath(path) + JOURNAL_SUFFIX
+        if self.journal is not None and self.journal.path == journal_path:
+            self.journal.reset(graph.num_edges(unique=False))
+        elif os.path.exists(journal_path):
+            os.remove(journal_path)
+
+    def compact(self):
+        """Fold the journal of a loaded model into a new base file, written
+        over the one it was loaded from, and map it. Returns the number of
+        records, transitions and bytes the journal held.
+        """
+        if self.journal is None:
+            raise Exception("only a model loaded from a file can be compacted")
+        report = self.journal.stats()
+        self.save(self.path)
+        self.graph, _ = storage.load(self.path)
+        return report
+
+    @classmethod
+    def load(cls, path, rng=None):
+        """Memory-map a model written by ``save``, plus the counts of its
+        journal. Learning on the loaded model appends the new counts to the
+        journal, at a cost proportional to the new text, and only folds them
+        into the graph (thawing it into a regular ``MarkovGraph``) when
+        generating or saving; ``compact`` writes them into the model file.
+        """
+        graph, set_tokenizer_name = storage.load(path)
+        generator = cls.__new__(cls)
+        generator._init_state(graph, rng)
+        generator.path = path
+        if os.path.exists(path + ORIGINALITY_SUFFIX):
+            from .bloom import OriginalityFilter
+            tokenizer_cls = graph.tokenizer_cls or MarkovGraph.tokenizer_cls
+            generator.originality = OriginalityFilter.load(path + ORIGINALITY_SUFFIX,
+                                                           tokenizer_cls())
+        from .journal import DeltaJournal
+        generator.journal = DeltaJournal(os.path.abspath(path) + JOURNAL_SUFFIX,
+                                         graph.order, graph.num_edges(unique=False))
+        for counts, tokens, hashes in generator.journal.records():
+            generator.pending_counts.append((counts, tokens))
+            if generator.originality is not None:
+                generator.originality.record_hashes(hashes)
+        set_tokenizer_cls = getattr(tokenizers, set_tokenizer_name, None) \
+                            if set_tokenizer_name else cls.set_tokenizer_cls
+        if set_tokenizer_cls is None:
+            raise Exception("unknown sentence tokenizer %s"%set_tokenizer_name)
+        generator.set_tokenizer = set_tokenizer_cls()
+        return generator
+
+    def generate_batch(self, num_sentences, max_len=MAX_INT, seed=None,
+                       max_attempts=MAX_ATTEMPTS):
+        """Generate ``num_sentences`` sentences at once on the compiled model
+        with NumPy, see ``FrozenMarkovGraph.generate_batch``. Much faster than
+        ``generate`` for bulk jobs, but the originality filter is not
+        applied. Returns a list.
+        """
+        num_sentences = self._ensure_positive_int_param("Number of sentences", num_sentences)
+        max_len = self._ensure_positive_int_param("Maximum length per sentence", max_len)
+        return self._compiled_graph().generate_batch(num_sentences, max_len, seed, max_attempts)
+
     @classmethod
     def _ensure_positive_int_param(cls, param_name, param_value=None):
         if param_value is not None:
@@ -35,17 +518,313 @@ class MarkovGenerator(object):
                 raise Exception("%s has to be an integer"%param_name)
         return param_value
 
-    def generate(self, num_sentences=MAX_INT, max_len=MAX_INT, **args):
-        """
+    def generate(self, num_sentences=MAX_INT, max_len=MAX_INT, length_aware=True,
+                 max_attempts=MAX_ATTEMPTS, rng=None, prefix=None, contains=None, **args):
+        """Yields ``num_sentences`` sentences of less than ``max_len``
+        characters from the compiled model.
+
+        With ``prefix``, sentences start with that text; with ``contains``,
+        they contain that word, or those words (at most ``order`` of them).
+        Both jump straight to the matching contexts, see ``_prepare_walks``.
+
+        By default walks are length-aware: they only take edges from which
+        the end of the sentence is reachable within ``max_len``, so no walk
+        is thrown away. With ``length_aware=False`` complete walks are
+        rejected until one is short enough, at most ``max_attempts`` times
+        per sentence. The number of rejected walks and of sentences that
+        needed a retry is kept in ``generation_report``, as is the number of
+        walks that copied the corpus when there is an originality filter;
+        those are drawn again too, within the same ``max_attempts``.
+
+        Sentences are drawn from ``rng`` if given, else from the generator's
+        own ``rng``: two generators built with the same seed yield the same
+        sentences.
         """
-        param = self._ensure_positive_int_param("Number of sentences", num_sentences)
+        num_sentences = self._ensure_positive_int_param("Number of sentences", num_sentences)
         max_len = self._ensure_positive_int_param("Maximum length per sentence", max_len)
-        root, end = self.graph.root_node_id(), self.graph.end_node_id()
+        walk = self._prepare_walks(max_len, length_aware, prefix, contains)
+        report = self.generation_report = self._new_report()
+        rng = self.rng if rng is None else make_rng(rng)
         for step in count():
             if step >= num_sentences: # False if num_sentences = None
                 break
-            phrase = " "*max_len
-            while len(phrase) >= max_len:
-                path = next(self.graph.random_walk(root,end))
-                phrase = self.graph._path_to_string(path)
-            yield phrase   
+            yield self._generate_one(walk, max_len, max_attempts, rng, report)
+
+    def generate_concurrent(self, num_sentences, workers=None, max_len=MAX_INT,
+                            seed=None, length_aware=True, max_attempts=MAX_ATTEMPTS,
+                            prefix=None, contains=None):
+        """Generate ``num_sentences`` sentences on ``workers`` threads
+        sharing the compiled model. Each worker draws from its own
+        ``random.Random``, seeded from ``seed``, so the result only depends
+        on ``seed`` and ``workers``. ``prefix`` and ``contains`` are those of
+        ``generate``. Returns a list.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        import multiprocessing
+        num_sentences = self._ensure_positive_int_param("Number of sentences", num_sentences)
+        max_len = self._ensure_positive_int_param("Maximum length per sentence", max_len)
+        workers = self._ensure_positive_int_param("Number of workers",
+                                                  workers or multiprocessing.cpu_count())
+        # the model is compiled and its length tables built before the
+        # threads start, after that they only read it
+        walk = self._prepare_walks(max_len, length_aware, prefix, contains)
+        seeds = random.Random(seed)
+        shares = [(num_sentences * (i+1)) // workers - (num_sentences * i) // workers
+                  for i in six.moves.range(workers)]
+        jobs = [(share, random.Random(seeds.getrandbits(64)), self._new_report())
+                for share in shares]
+
+        def work(job):
+            share, rng, report = job
+            return [self._generate_one(walk, max_len, max_attempts, rng, report)
+                    for _ in six.moves.range(share)]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            sentences = list(chain.from_iterable(executor.map(work, jobs)))
+        self.generation_report = self._new_report()
+        for _, _, report in jobs:
+            for key, value in report.items():
+                self.generation_report[key] += value
+        return sentences
+
+    @classmethod
+    def _new_report(cls):
+        return {"sentences": 0, "rejections": 0, "retries": 0, "copies": 0}
+
+    def _walk_phrase(self, walk, rng, max_len):
+        """Returns one random sentence, or None when a ``contains`` walk
+        could not fit in ``max_len``"""
+        start, end, bound, head, through = walk
+        if through is not None:
+            start, _ = cumulative_choice(through[0], through[1], rng)
+            head = self.graph._path_to_string(self.graph.random_path_to(start, rng))
+        if bound is not None:
+            bound -= len(head)
+            if self.graph._length_tables()[0][start] >= bound:
+                return None
+        return head + u"".join(self.graph.iter_tokens(start, end, bound, rng))
+
+    def _instrumented_walk_phrase(self):
+        """Same as ``_walk_phrase``, walking first and rendering the path
+        after so that each can be timed (the random draws, hence the
+        sentences, are the same).
+        """
+        instruments = self.instruments
+        random_walk = instruments.timed(
+            "walk", lambda root, end, bound, rng: next(self.graph.random_walk(root, end, bound, rng)))
+        render = instruments.timed("render", lambda path: self.graph._path_to_string(path))
+        # prefix and contains walks are timed as a whole
+        seeded_walk = instruments.timed(
+            "walk", lambda walk, rng, max_len: MarkovGenerator._walk_phrase(self, walk, rng, max_len))
+
+        def walk_phrase(walk, rng, max_len):
+            root, end, bound, head, through = walk
+            if head or through is not None:
+                phrase = seeded_walk(walk, rng, max_len)
+            else:
+                path = random_walk(root, end, bound, rng)
+                phrase = render(path)
+                instruments.walk(len(path))
+            instruments.count("walks")
+            if phrase is None or len(phrase) >= max_len:
+                instruments.count("rejections")
+            return phrase
+        return walk_phrase
+
+    def _generate_one(self, walk, max_len, max_attempts, rng, report):
+        originality = self.originality
+        copies = 0
+        for attempt in six.moves.range(max_attempts):
+            phrase = self._walk_phrase(walk, rng, max_len)
+            if phrase is None or len(phrase) >= max_len:
+                report["rejections"] += 1
+            elif originality is not None and originality.copies(phrase):
+                copies += 1
+            else:
+                break
+        else:
+            report["copies"] += copies
+            if copies:
+                raise Exception("could not generate an original sentence shorter "
+                                "than %d characters in %d attempts"%(max_len, max_attempts))
+            raise Exception("could not generate a sentence shorter than %d "
+                            "characters in %d attempts"%(max_len, max_attempts))
+        report["sentences"] += 1
+        report["copies"] += copies
+        if attempt:
+            report["retries"] += 1
+        return phrase
+
+    def generate_stream(self, max_len=MAX_INT, rng=None):
+        """Yields the fragments (a token and its trailing space) of a single
+        sentence of less than ``max_len`` characters as they are generated,
+        so the first token is available before the walk is over.
+        """
+        max_len = self._ensure_positive_int_param("Maximum length per sentence", max_len)
+        root, end, bound, _, _ = self._prepare_walks(max_len)
+        rng = self.rng if rng is None else make_rng(rng)
+        for fragment in self.graph.iter_tokens(root, end, bound, rng):
+            yield fragment
+
+    def _prepare_walks(self, max_len, length_aware=True, prefix=None, contains=None):
+        """Compiles the model and returns ``(start, end, bound, head,
+        through)``: the nodes to walk from and to, the length bound to walk
+        with and the text rendered before the start node.
+
+        With ``prefix``, the walk starts at the end of the path from the root
+        rendering it. With ``contains``, ``through`` is the sampling table of
+        the contexts ending with its tokens, weighted by how often each was
+        reached; each walk goes through one of them, drawn backwards to the
+        root and forwards to the end. Both use the token index of the graph,
+        so their cost does not grow with the size of the model.
+        """
+        if prefix is not None and contains is not None:
+            raise Exception("prefix and contains cannot be combined")
+        graph = self._compiled_graph()
+        start, end = graph.root_node_id(), graph.end_node_id()
+        head, through = u"", None
+        if prefix is not None:
+            path = graph.path_from_root(self._token_ids(prefix))
+            if path is None:
+                raise Exception("no sentence starts with %r"%prefix)
+            start, head = path[-1], graph._path_to_string(path)
+        elif contains is not None:
+            through = cumulative_table(
+                (node, graph.in_count(node)) for node in
+                graph.nodes_ending_with(self._token_ids(contains)))
+            if not through[0]:
+                raise Exception("no sentence contains %r"%contains)
+        if through is None and graph._length_tables()[0][start] >= UNREACHABLE:
+            if prefix is not None:
+                raise Exception("no sentence starts with %r"%prefix)
+            raise Exception("no sentence goes from the start to the end of the model")
+        if max_len == MAX_INT:
+            return start, end, None, head, through
+        if through is None and len(head) + graph._length_tables()[0][start] >= max_len:
+            raise Exception("no sentence is shorter than %d characters"%max_len)
+        return start, end, max_len if length_aware else None, head, through
+
+    def _token_ids(self, text):
+        """The ids of the tokens of ``text`` in the compiled graph"""
+        tokenizer_cls = self.graph.tokenizer_cls or MarkovGraph.tokenizer_cls
+        tokens = [token for token in tokenizer_cls().split(text) if token.strip()]
+        if not tokens:
+            raise Exception("%r has no token"%text)
+        token_ids = [self.graph.token_id(token) for token in tokens]
+        if None in token_ids:
+            raise Exception("%r was never learnt"%tokens[token_ids.index(None)])
+        return token_ids
+
+
+class SketchMarkovGenerator(MarkovGenerator):
+    """``MarkovGenerator`` counting transitions approximately in a
+    ``SketchMarkovGraph`` of ``width * depth`` counters, keeping the
+    ``heavy_hitters`` most frequent successors of each context. Compiling
+    keeps the sketch, so learning again after generating carries on with
+    it. A model loaded from a file has no sketch and learns exactly. The
+    sketch sizes default to those of ``SketchMarkovGraph``.
+    """
+    def __init__(self, order, width=None, depth=None, heavy_hitters=None, rng=None):
+        from .sketch import (SketchMarkovGraph, WIDTH, DEPTH, HEAVY_HITTERS)
+        super(SketchMarkovGenerator, self).__init__(order, rng)
+        self.graph = self.sketch = SketchMarkovGraph(
+            order, WIDTH if width is None else width, DEPTH if depth is None else depth,
+            HEAVY_HITTERS if heavy_hitters is None else heavy_hitters)
+
+    @classmethod
+    def load(cls, path, rng=None):
+        generator = super(SketchMarkovGenerator, cls).load(path, rng)
+        generator.sketch = None
+        return generator
+
+    def _thawed_graph(self):
+        if self.sketch is None:
+            return super(SketchMarkovGenerator, self)._thawed_graph()
+        return self.sketch
+
+    def _frozen_graph(self):
+        if self.graph is not self.sketch:
+            return super(SketchMarkovGenerator, self)._frozen_graph()
+        return FrozenMarkovGraph.from_graph(self.sketch.heavy_graph())
+
+
+class BackoffMarkovGenerator(object):
+    """Generator over the contexts of every order up to ``max_order``,
+    counted in a single ``ContextTrie``. Each token is drawn after the
+    longest context seen at least ``min_support`` times, so rare contexts
+    back off to shorter ones. ``generate(max_order=n, min_support=1)`` walks
+    the plain order-n chain, so orders can be compared on one model.
+    """
+    set_tokenizer_cls = SentenceTokenizer
+
+    def __init__(self, max_order, min_support=MIN_SUPPORT, rng=None):
+        from .trie import ContextTrie
+        self.graph = ContextTrie(max_order)
+        self.set_tokenizer = self.set_tokenizer_cls()
+        self.min_support = min_support
+        self.rng = make_rng(rng)
+
+    def learn(self, text):
+        """Update the counts of every order from the text. Returns the
+        number of sentences learnt.
+        """
+        return self.learn_stream([text])
+
+    def learn_stream(self, chunks):
+        """Same as ``learn`` for an iterable of text chunks, see
+        ``MarkovGenerator.learn_stream``.
+        """
+        graph = self.graph
+        return graph.update_by_token_streams(
+            self.set_tokenizer.token_streams(chunks, graph.tokenizer))
+
+    def learn_file(self, path, chunk_size=CHUNK_SIZE, encoding="utf-8"):
+        """Learn from the text file at ``path``, read ``chunk_size``
+        characters at a time. Returns the number of sentences learnt.
+        """
+        return self.learn_stream(MarkovGenerator._read_chunks(path, chunk_size, encoding))
+
+    def stats(self):
+        return self.graph.stats()
+
+    def generate(self, num_sentences=MAX_INT, max_len=MAX_INT, max_order=None,
+                 min_support=None, max_attempts=MAX_ATTEMPTS, rng=None):
+        """Yields ``num_sentences`` sentences of less than ``max_len``
+        characters, using contexts of at most ``max_order`` tokens (default:
+        all of them) seen at least ``min_support`` times (default: the
+        generator's). Walks that get too long are dropped as soon as they
+        do, at most ``max_attempts`` times per sentence; the counts are kept
+        in ``generation_report``.
+        """
+        ensure = MarkovGenerator._ensure_positive_int_param
+        num_sentences = ensure("Number of sentences", num_sentences)
+        max_len = ensure("Maximum length per sentence", max_len)
+        if min_support is None:
+            min_support = self.min_support
+        rng = self.rng if rng is None else make_rng(rng)
+        report = self.generation_report = MarkovGenerator._new_report()
+        for step in count():
+            if step >= num_sentences:
+                break
+            yield self._generate_one(max_len, max_order, min_support, max_attempts,
+                                     rng, report)
+
+    def _generate_one(self, max_len, max_order, min_support, max_attempts, rng, report):
+        for attempt in six.moves.range(max_attempts):
+            fragments, length = [], 0
+            for fragment in self.graph.iter_tokens(max_order, min_support, rng):
+                fragments.append(fragment)
+                length += len(fragment)
+                if length >= max_len:
+                    break
+            phrase = u"".join(fragments)
+            if len(phrase) < max_len:
+                break
+            report["rejections"] += 1
+        else:
+            raise Exception("could not generate a sentence shorter than %d "
+                            "characters in %d attempts"%(max_len, max_attempts))
+        report["sentences"] += 1
+        if attempt:
+            report["retries"] += 1
+        return phrase
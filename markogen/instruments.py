@@ -0,0 +1,67 @@
+"""Opt-in timers and counters, see ``MarkovGenerator.instrument``.
+
+Instrumentation works by replacing methods on the instrumented objects
+with timed wrappers, so objects that are not instrumented run exactly the
+same code as before.
+"""
+import time
+
+try:
+    clock = time.perf_counter
+except AttributeError: # python 2
+    clock = time.time
+
+class Instruments(object):
+    """Per-phase timers, counters and a walk length histogram.
+
+    Timers are exclusive: the time of a timed call made from another timed
+    call is only counted in its own phase.
+    """
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.walk_lengths = {}
+        self._inner = 0.0
+
+    def timed(self, phase, func):
+        """Returns ``func`` wrapped to add its running time to ``phase``"""
+        timers = self.timers
+        def wrapper(*args, **kwargs):
+            outer, self._inner = self._inner, 0.0
+            started = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - started
+                calls, seconds = timers.get(phase, (0, 0.0))
+                timers[phase] = (calls + 1, seconds + elapsed - self._inner)
+                self._inner = outer + elapsed
+        return wrapper
+
+    def timed_iter(self, phase, func):
+        """Same as ``timed`` for a function returning an iterator: the time
+        spent producing each item is added to ``phase``.
+        """
+        def wrapper(*args, **kwargs):
+            items = iter(func(*args, **kwargs))
+            step = self.timed(phase, lambda: next(items, StopIteration))
+            while True:
+                item = step()
+                if item is StopIteration:
+                    return
+                yield item
+        return wrapper
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def walk(self, length):
+        self.walk_lengths[length] = self.walk_lengths.get(length, 0) + 1
+
+    def report(self):
+        return {
+            "timers": {phase: {"calls": calls, "seconds": seconds}
+                       for phase, (calls, seconds) in self.timers.items()},
+            "counters": dict(self.counters),
+            "walk_lengths": dict(self.walk_lengths),
+        }
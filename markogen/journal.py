@@ -0,0 +1,184 @@
+"""Append-only journal of the transition counts learnt by a saved model
+since it was written, so that keeping a model fresh costs what the new text
+costs instead of a rewrite of the whole model. ``MarkovGenerator``
+replays it on ``load`` and folds it into a new base file on ``compact``.
+
+The journal is kept next to its model, in ``model.bin.delta``::
+
+    header   MAGIC, version, byte order, order, transitions of the base
+    record   number of tokens, blob size, number of transitions and of
+             originality hashes, crc32
+             token lengths  uint32 x num_tokens
+             token blob     utf-8 encoded tokens
+             contexts       int32 x (num_transitions * (order + 1)), the
+                            previous context then the last token of the next
+             counts         int64 x num_transitions, ``count << 1 | has_space``
+             hashes         uint64 x (2 * num_hashes), the ``item_hashes`` of
+                            the sentences for the model's originality filter
+    record   ...
+
+Token ids of a record refer to its own token list. The base is identified
+by its number of transitions, which every record adds to: a journal left
+over by a compaction that did not get to empty it no longer matches the new
+base and is ignored, and started over by the next record. A record cut
+short by a crash is ignored too, and cut off by the next one.
+
+Records are appended under an exclusive lock of the file (where ``fcntl``
+is available), so that processes learning on the same model do not
+overwrite each other's records.
+"""
+from array import array
+import os
+import struct
+import sys
+import zlib
+try:
+    import fcntl
+except ImportError: # windows
+    fcntl = None
+
+MAGIC = b"MKDJ"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sIcxxxIq")
+RECORD = struct.Struct("<IIIII")
+BYTE_ORDER = b"<" if sys.byteorder == "little" else b">"
+
+class DeltaJournal(object):
+    """Journal at ``path`` of the counts learnt by the model of order
+    ``order`` holding ``base_transitions`` transitions. The file is only
+    created by the first ``append``.
+    """
+    def __init__(self, path, order, base_transitions):
+        self.path = path
+        self.order = order
+        self.base_transitions = base_transitions
+        self.size = 0 # bytes of the file holding valid records
+        # the size of the file when ``records`` found a record cut short
+        # after them, if it did
+        self.torn_size = None
+        # what the valid records hold, once read or written
+        self.num_records = self.num_transitions = 0
+
+    def records(self):
+        """Yields the ``(counts, tokens, hashes)`` recorded for the base,
+        the counts and tokens as given to ``MarkovGraph.add_transition_counts``
+        and the hashes as given to ``OriginalityFilter.record_hashes``
+        """
+        self.size = self.num_records = self.num_transitions = 0
+        self.torn_size = None
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            return
+        magic, version, byte_order, order, base_transitions = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise Exception("%s is not a markogen delta journal"%self.path)
+        if version != FORMAT_VERSION:
+            raise Exception("unsupported delta journal version %d"%version)
+        if byte_order != BYTE_ORDER:
+            raise Exception("delta journal was written with a different byte order")
+        if order != self.order:
+            raise Exception("delta journal of order %d for a model of order %d"%(
+                order, self.order))
+        if base_transitions != self.base_transitions:
+            return # folded into the base already
+        pos = self.size = HEADER.size
+        while pos + RECORD.size <= len(data):
+            num_tokens, blob_len, num_transitions, num_hashes, crc = \
+                RECORD.unpack_from(data, pos)
+            start = pos + RECORD.size
+            end = start + 4*num_tokens + blob_len + 4*num_transitions*(order + 1) \
+                  + 8*num_transitions + 16*num_hashes
+            if end > len(data) or zlib.crc32(data[start:end]) & 0xffffffff != crc:
+                break
+            counts, tokens, hashes = self._decode(data[start:end], num_tokens, blob_len,
+                                                  num_transitions)
+            pos = self.size = end
+            self.num_records += 1
+            self.num_transitions += sum(count for count, _ in counts.values())
+            yield counts, tokens, hashes
+        if pos < len(data):
+            self.torn_size = len(data)
+
+    def _decode(self, payload, num_tokens, blob_len, num_transitions):
+        order = self.order
+        lengths = array('I')
+        lengths.frombytes(payload[:4*num_tokens])
+        pos = 4*num_tokens
+        tokens = []
+        for length in lengths:
+            tokens.append(payload[pos:pos+length].decode("utf-8"))
+            pos += length
+        keys = array('i')
+        keys.frombytes(payload[pos:pos+4*num_transitions*(order + 1)])
+        pos += 4*num_transitions*(order + 1)
+        packed = array('q')
+        packed.frombytes(payload[pos:pos+8*num_transitions])
+        flat = array('Q')
+        flat.frombytes(payload[pos+8*num_transitions:])
+        hashes = list(zip(flat[0::2], flat[1::2]))
+        counts = {}
+        for idx in range(num_transitions):
+            prev = tuple(keys[idx*(order + 1):idx*(order + 1) + order])
+            curr = prev[1:] + (keys[idx*(order + 1) + order],)
+            counts[prev, curr] = (packed[idx] >> 1, packed[idx] & 1)
+        return counts, tokens, hashes
+
+    def append(self, counts, tokens, hashes=()):
+        """Writes a record of ``counts`` (as returned by
+        ``MarkovGraph.count_transitions``), their context ids being indices
+        in ``tokens``, and of the originality ``hashes`` of their sentences
+        """
+        keys, packed = array('i'), array('q')
+        for (prev, curr), (count, has_space) in counts.items():
+            if curr[:-1] != prev[1:]:
+                raise Exception("%r cannot follow %r"%(curr, prev))
+            keys.extend(prev)
+            keys.append(curr[-1])
+            packed.append(count << 1 | bool(has_space))
+        flat = array('Q')
+        for low, high in hashes:
+            flat.append(low)
+            flat.append(high)
+        encoded = [token.encode("utf-8") for token in tokens]
+        payload = b"".join([array('I', [len(token) for token in encoded]).tobytes()]
+                           + encoded + [keys.tobytes(), packed.tobytes(), flat.tobytes()])
+        record = RECORD.pack(len(encoded), sum(len(token) for token in encoded),
+                             len(packed), len(flat) // 2, zlib.crc32(payload) & 0xffffffff)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER,
+                             self.order, self.base_transitions)
+        # writes go to the end of the file whatever the position
+        with open(self.path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            f.seek(0)
+            if f.read(HEADER.size) != header:
+                # a new journal, or one left over from an older base
+                f.truncate(0)
+                f.write(header)
+            elif self.torn_size is not None and \
+                 os.fstat(f.fileno()).st_size == self.torn_size:
+                # drops what a crash left after the last record, unless
+                # another writer has appended since
+                f.truncate(self.size)
+            self.torn_size = None
+            f.write(record)
+            f.write(payload)
+            f.flush()
+            self.size = f.tell()
+        self.num_records += 1
+        self.num_transitions += sum(count >> 1 for count in packed)
+
+    def reset(self, base_transitions):
+        """Empties the journal of a base now holding ``base_transitions``"""
+        self.base_transitions = base_transitions
+        self.size = self.num_records = self.num_transitions = 0
+        self.torn_size = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def stats(self):
+        return {"records": self.num_records, "transitions": self.num_transitions,
+                "bytes": self.size}
@@ -1,8 +1,10 @@
 
-from collections import deque
+from array import array
 import six
+from six.moves import collections_abc
 
-from .tools import weighted_choice
+from .tools import (weighted_choice, cumulative_table, cumulative_choice,
+                    deep_sizeof, score_sentences, SMOOTHING)
 from .tokenizers import (HappyTokenizer, CobeTokenizer)
 
 class Graph(object):
@@ -92,8 +94,8 @@ class Graph(object):
 
     def num_edges(self, unique=True):
         """number of edges in the graph"""
-        edges = list((q for _, v in six.iteritems(self.adj) if v\
-                       for _, q in six.iteritems(v)))
+        edges = (q for _, v in six.iteritems(self.adj) if v\
+                   for _, q in six.iteritems(v))
         if unique:
             return sum(1 for _ in edges)
         else:
@@ -145,35 +147,139 @@ class Graph(object):
             for nbr in nbrs:
                 yield (node, nbr)
 
+class Vocabulary(object):
+    """Interns tokens to consecutive integer ids."""
+    def __init__(self, tokens=()):
+        self.ids = {}
+        self.tokens = []
+        for token in tokens:
+            self.intern(token)
+
+    def intern(self, token):
+        """Returns the id of ``token``, assigning a new one if needed."""
+        try:
+            return self.ids[token]
+        except KeyError:
+            token_id = len(self.tokens)
+            self.ids[token] = token_id
+            self.tokens.append(token)
+            return token_id
+
+    def id_of(self, token, default=None):
+        return self.ids.get(token, default)
+
+    def token(self, token_id):
+        return self.tokens[token_id]
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.ids
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+class EdgeView(collections_abc.MutableMapping):
+    """The ``{"count", "has_space"}`` attributes of a ``MarkovGraph`` edge,
+    read from and written to its packed value. Writing the count keeps the
+    graph's ``transition_total`` up to date.
+    """
+    __slots__ = ("graph", "nbrs", "succ")
+    KEYS = ("count", "has_space")
+
+    def __init__(self, graph, nbrs, succ):
+        if succ not in nbrs:
+            raise KeyError(succ)
+        self.graph = graph
+        self.nbrs = nbrs
+        self.succ = succ
+
+    def __getitem__(self, key):
+        packed = self.nbrs[self.succ]
+        if key == "count":
+            return packed >> 1
+        if key == "has_space":
+            return bool(packed & 1)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        packed = self.nbrs[self.succ]
+        if key == "count":
+            self.nbrs[self.succ] = value << 1 | packed & 1
+            self.graph.transition_total += value - (packed >> 1)
+            self.graph.samplers = self.graph._pred = self.graph._compiled_copy = None
+        elif key == "has_space":
+            self.nbrs[self.succ] = packed & ~1 | bool(value)
+            self.graph._compiled_copy = None
+        else:
+            raise Exception("unsupported edge attribute %s"%key)
+
+    def __delitem__(self, key):
+        raise Exception("edge attributes cannot be removed")
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
 class MarkovGraph(Graph):
-    """"""
+    """Order-n markov chain. Tokens are interned in ``vocab`` and each
+    node is a context of ``order`` token ids, stored flat in ``contexts``
+    and keyed by the id tuple in ``toks``.
+
+    Nodes are numbered in creation order. Only successors are stored:
+    ``succ[node]`` maps each successor to the packed edge value
+    ``count << 1 | has_space``, and ``get_edge`` / ``out_edges_iter`` return
+    ``EdgeView`` s over it. ``pred`` is built on first use.
+    """
     START_TOKEN = "[START]"
     END_TOKEN = "[END]"
     tokenizer_cls = CobeTokenizer
 
     def __init__(self, order, **attr):
-        super(MarkovGraph, self).__init__(**attr)
+        self.succ = []
+        self.adj = self.succ
+        self.graph = dict(attr)
+        self._pred = None
         self.order = order
         self.toks = {}
         self.tokenizer = self.tokenizer_cls()
         self.START_CONTEXT = [self.START_TOKEN]*self.order
         self.END_CONTEXT = [self.END_TOKEN]*self.order
 
-        self.last_token_key = "token_%d"%(self.order-1)
+        self.vocab = Vocabulary([self.START_TOKEN, self.END_TOKEN])
+        self.START_ID = self.vocab.id_of(self.START_TOKEN)
+        self.END_ID = self.vocab.id_of(self.END_TOKEN)
+        self.contexts = array('i')
+        self.samplers = None
+        self._compiled_copy = None
+        # kept up to date by every edge update, see ``num_edges``
+        self.edge_total = 0
+        self.transition_total = 0
 
     def add_token_node(self, tokens):
         if len(tokens) != self.order:
             raise Exception("token length must be"\
                "equal to order (%d)" %self.order)
+        return self._add_context_node(self._node_key_from_tokens(tokens))
 
-        key = self._node_key_from_tokens(tokens)
-        if key in self.toks:
-            return self.toks[key]
-
-        node_id = self.num_nodes()
-        attr_dict = {"token_%d"%(idx): token \
-                     for idx, token in enumerate(tokens)}
-        super(MarkovGraph, self).add_node(node_id, attr_dict)
+    def _add_context_node(self, key):
+        """Returns the node of the context ``key`` (a tuple of token ids),
+        creating it if needed.
+        """
+        node_id = self.toks.get(key)
+        if node_id is not None:
+            return node_id
+
+        node_id = len(self.succ)
+        self.succ.append({})
+        self._pred = None
+        self.contexts.extend(key)
         self.toks[key] = node_id
         return node_id
 
@@ -181,23 +287,58 @@ class MarkovGraph(Graph):
         tokens = self.tokenizer.split(sentence)
         return self.START_CONTEXT + tokens + self.END_CONTEXT
 
-    def _contexts_by_sentence(self, sentence):
+    def _contexts_by_sentence(self, sentence, token_id=None):
+        """Yields the ``(context key, has_space)`` of the sentence, tokens
+        being interned unless another ``token_id`` function is given
+        """
         tokens = self._tokenize(sentence)
-        context = deque(maxlen=self.order)
+        return self._contexts_by_tokens(tokens, self.order,
+                                        self.vocab.intern if token_id is None else token_id)
+
+    @classmethod
+    def _contexts_by_tokens(cls, tokens, order, token_id):
+        """Returns the list of ``(context key, has_space)`` of ``tokens``,
+        ``has_space`` telling whether a space came since the previous
+        context
+        """
+        ids, spaces = [], []
         has_space = False
-        for i in six.moves.range(len(tokens)):
-            context.append(tokens[i])
-            if len(context) == self.order:
-                if tokens[i] == ' ':
-                    context.pop()
-                    has_space = True
-                    continue
-                yield tuple(context), has_space
-                context.popleft()
-                has_space = False
+        for token in tokens:
+            if token == ' ':
+                has_space = True
+                continue
+            ids.append(token_id(token))
+            spaces.append(has_space)
+            has_space = False
+        if len(ids) < order:
+            return []
+        spaces[order-1] = any(spaces[:order])
+        return [(tuple(ids[i-order+1:i+1]), spaces[i])
+                for i in six.moves.range(order-1, len(ids))]
+
     @classmethod
-    def _node_key_from_tokens(cls, tokens):
-        return "".join(token for token in tokens)
+    def _transition_keys(cls, contexts, end_id):
+        """Returns the ``(prev, curr)`` context keys of a sentence up to the
+        first end token, the transitions after it being certain
+        """
+        keys = []
+        for (prev, _), (curr, _) in six.moves.zip(contexts, contexts[1:]):
+            if prev[-1] == end_id:
+                break
+            keys.append((prev, curr))
+        return keys
+
+    def _node_key_from_tokens(self, tokens):
+        """Interns ``tokens`` and returns the tuple of their ids"""
+        intern = self.vocab.intern
+        return tuple(intern(token) for token in tokens)
+
+    def _lookup_key_from_tokens(self, tokens):
+        """Same as ``_node_key_from_tokens`` without interning. Returns
+        None when a token is unknown.
+        """
+        ids = tuple(self.vocab.id_of(token) for token in tokens)
+        return None if None in ids else ids
 
     @classmethod
     def _edges_by_contexts(cls, contexts):
@@ -212,46 +353,264 @@ class MarkovGraph(Graph):
     def update_by_sentence(self, sentence):
         contexts = self._contexts_by_sentence(sentence)
         for prev, curr, has_space in self._edges_by_contexts(contexts):
-            prev_node = self.add_token_node(prev)
-            curr_node = self.add_token_node(curr)
+            prev_node = self._add_context_node(prev)
+            curr_node = self._add_context_node(curr)
             self.add_edge(prev_node, curr_node, has_space=has_space)
 
+    def count_transitions(self, sentences):
+        """Counts the transitions of ``sentences`` without adding them to
+        the graph (tokens are still interned in ``vocab``). Returns a dict
+        mapping ``(prev, curr)`` context keys to ``[count, has_space]`` in
+        first-seen order, ``has_space`` being that of the last occurrence.
+
+        This is the bulk counterpart of ``update_by_sentence``: contexts are
+        sliced straight out of the sentence id list and each transition
+        costs a single dict lookup.
+        """
+        return self.count_token_transitions(six.moves.map(self.tokenizer.split, sentences))
+
+    def count_token_transitions(self, token_streams):
+        """Same as ``count_transitions`` for sentences already split into
+        tokens, such as the ones of ``SentenceTokenizer.token_streams``. Any
+        whitespace-only token counts as a space.
+        """
+        counts = {}
+        get = counts.get
+        order = self.order
+        intern = self.vocab.intern
+        # token as matched -> its id, or -1 for whitespace, so that each
+        # token costs a single lookup
+        token_ids = {}
+        known = token_ids.get
+        head, tail = [self.START_ID]*order, [self.END_ID]*order
+        for tokens in token_streams:
+            ids, spaces = list(head), [False]*order
+            has_space = False
+            for token in tokens:
+                token_id = known(token)
+                if token_id is None:
+                    token_id = token_ids[token] = intern(token) if token.strip() else -1
+                if token_id < 0:
+                    has_space = True
+                    continue
+                ids.append(token_id)
+                spaces.append(has_space)
+                has_space = False
+            ids.extend(tail)
+            spaces.append(has_space)
+            spaces.extend([False]*(order-1))
+
+            prev = tuple(ids[:order])
+            for i in six.moves.range(1, len(ids) - order + 1):
+                curr = tuple(ids[i:i+order])
+                key = (prev, curr)
+                entry = get(key)
+                if entry is None:
+                    counts[key] = [1, spaces[i+order-1]]
+                else:
+                    entry[0] += 1
+                    entry[1] = spaces[i+order-1]
+                prev = curr
+        return counts
+
+    def add_transition_counts(self, counts, tokens=None):
+        """Folds the result of ``count_transitions`` into the graph, as if
+        the sentences had been learnt one by one. ``tokens`` is the token list
+        the context ids refer to when they were counted by another graph.
+        """
+        if tokens is not None:
+            ids = [self.vocab.intern(token) for token in tokens]
+            translate = lambda key: tuple(ids[token_id] for token_id in key)
+        self.samplers = self._pred = self._compiled_copy = None
+        succ = self.succ
+        for (prev, curr), (count, has_space) in six.iteritems(counts):
+            if tokens is not None:
+                prev, curr = translate(prev), translate(curr)
+            prev_node = self._add_context_node(prev)
+            curr_node = self._add_context_node(curr)
+            nbrs = succ[prev_node]
+            packed = nbrs.get(curr_node)
+            if packed is None:
+                nbrs[curr_node] = count << 1 | has_space
+                self.edge_total += 1
+            else:
+                nbrs[curr_node] = ((packed >> 1) + count) << 1 | has_space
+            self.transition_total += count
+
     def node_by_tokens(self, tokens):
-        key = self._node_key_from_tokens(tokens)
-        return self.node[self.toks[key]]
+        return self.node_by_id(self.node_id_by_tokens(tokens))
 
     def node_by_id(self, node_id):
-        return self.node[node_id]
+        """Returns the token ids of the node context"""
+        start = node_id*self.order
+        return tuple(self.contexts[start:start+self.order])
+
+    def node_tokens(self, node_id):
+        """Returns the tokens of the node context"""
+        return tuple(self.vocab.token(token_id) \
+                     for token_id in self.node_by_id(node_id))
+
+    def last_token_id(self, node_id):
+        return self.contexts[node_id*self.order + self.order - 1]
+
+    def freeze(self):
+        """Compile the outgoing counts of every node into a cumulative
+        table so that ``random_step`` runs in O(log d) without building
+        the neighbour list. Any later ``add_edge`` thaws the graph.
+        """
+        self.samplers = {node: cumulative_table((succ, packed >> 1) \
+                                                for succ, packed in six.iteritems(nbrs))
+                         for node, nbrs in enumerate(self.succ) if nbrs}
+        return self
+
+    def is_frozen(self):
+        return self.samplers is not None
+
+    def num_nodes(self):
+        return len(self.succ)
+
+    def graph_order(self):
+        return len(self.succ)
+
+    def __iter__(self):
+        return iter(six.moves.range(len(self.succ)))
+
+    def node_iter(self, data=False):
+        if data:
+            return ((node, {}) for node in self)
+        return iter(self)
+
+    def add_node(self, node, attr_dict=None, **attrs):
+        raise Exception("markov nodes are added by their context, "
+                        "see add_token_node")
+
+    def num_edges(self, unique=True):
+        """number of edges in the graph, or of transitions learnt if not
+        ``unique``
+        """
+        return self.edge_total if unique else self.transition_total
+
+    @property
+    def pred(self):
+        """Predecessor adjacency, ``pred[node]`` mapping each predecessor
+        to the packed edge value. Built on first use after an update.
+        """
+        if self._pred is None:
+            pred = [{} for _ in self.succ]
+            for node, nbrs in enumerate(self.succ):
+                for succ, packed in six.iteritems(nbrs):
+                    pred[succ][node] = packed
+            self._pred = pred
+        return self._pred
+
+    def predecessors(self, node):
+        return list(self.pred[node])
+
+    def get_edge(self, pred, succ):
+        return EdgeView(self, self.succ[pred], succ)
+
+    def successors_iter(self, node):
+        try:
+            return iter(self.succ[node])
+        except IndexError:
+            raise Exception("The node %s is not in the digraph."%(node,))
+
+    def out_edges_iter(self, node, data=True):
+        nbrs = self.succ[node]
+        for nbr in nbrs:
+            yield (node, nbr, EdgeView(self, nbrs, nbr)) if data else (node, nbr)
 
-    def random_step(self, node):
-        nbrs = [(succ, dat["count"]) for (_, succ, dat) \
-                 in self.out_edges_iter(node)]
-        succ = weighted_choice(nbrs)
+    def edge_iter(self, data=False):
+        for node in self:
+            for edge in self.out_edges_iter(node, data):
+                yield edge
+
+    def update_edge_attrs(self, pred, succ, **attrs):
+        self.samplers = self._pred = self._compiled_copy = None
+        self.get_edge(pred, succ).update(attrs)
+
+    def stats(self):
+        """Size of the model"""
+        return {"nodes": self.num_nodes(), "edges": self.edge_total,
+                "transitions": self.transition_total, "tokens": len(self.vocab)}
+
+    def random_step(self, node, rng=None):
+        if self.samplers is not None:
+            succs, cumulative = self.samplers[node]
+            return cumulative_choice(succs, cumulative, rng)
+        nbrs = [(succ, packed >> 1) for succ, packed \
+                 in six.iteritems(self.succ[node])]
+        succ = weighted_choice(nbrs, rng=rng)
         return succ
 
     def edge_count(self, pred, succ):
         """get the count property"""
-        datadict = self.adj[pred].get(succ, dict())
-        return datadict.get("count", 0)
+        return self.succ[pred].get(succ, 0) >> 1
 
     def add_edge(self, pred, succ, attr_dict=None, **attrs):
-        super(MarkovGraph, self).add_edge(pred, succ, attr_dict, **attrs)
-        count = self.edge_count(pred, succ) + 1
-        self.update_edge_attrs(pred, succ, count=count)
-
-    def random_walk(self, start_node, end_node):
-        nodes = deque([(start_node, tuple())])
-        while nodes:
-            curr, path = nodes.popleft()
-            succ, _ = self.random_step(curr)
-            newpath = path + (succ,)
-            if succ == end_node:
-                yield newpath
-            else:
-                nodes.append((succ, newpath))
+        self.add_edge_count(pred, succ, 1, attr_dict, **attrs)
+
+    def add_edge_count(self, pred, succ, count, attr_dict=None, **attrs):
+        """Same as ``add_edge`` repeated ``count`` times"""
+        if attr_dict is not None:
+            attrs = dict(attr_dict, **attrs)
+        self.samplers = self._pred = self._compiled_copy = None
+        nbrs = self.succ[pred]
+        packed = nbrs.get(succ)
+        if packed is None:
+            packed = 0
+            self.edge_total += 1
+        self.transition_total += count
+        nbrs[succ] = packed + (count << 1)
+        if attrs:
+            EdgeView(self, nbrs, succ).update(attrs)
+
+    def random_walk(self, start_node, end_node, max_len=None, rng=None):
+        """Yields one random path from ``start_node`` to ``end_node``. With
+        ``max_len``, the walk is taken on a compiled copy of the graph, see
+        ``FrozenMarkovGraph.random_walk``, kept until the graph is updated.
+        """
+        if max_len is not None:
+            for path in self._compiled().random_walk(start_node, end_node, max_len, rng):
+                yield path
+            return
+        path = []
+        curr = start_node
+        while curr != end_node:
+            curr, _ = self.random_step(curr, rng)
+            path.append(curr)
+        yield tuple(path)
+
+    def iter_tokens(self, start_node, end_node, max_len=None, rng=None):
+        """Yields the rendered fragments (a token and its trailing space) of
+        a random walk as each step is taken, see ``random_walk`` for
+        ``max_len``.
+        """
+        if max_len is not None:
+            for fragment in self._compiled().iter_tokens(start_node, end_node, max_len, rng):
+                yield fragment
+            return
+        curr = start_node
+        while curr != end_node:
+            succ, _ = self.random_step(curr, rng)
+            if curr != start_node:
+                token_id = self.last_token_id(curr)
+                if token_id != self.END_ID:
+                    token = self.vocab.token(token_id)
+                    yield token + " " if self.succ[curr][succ] & 1 else token
+            curr = succ
+
+    def _compiled(self):
+        """The ``FrozenMarkovGraph`` copy of the graph, same node ids, built
+        on first use and dropped by any update of the edges
+        """
+        if getattr(self, "_compiled_copy", None) is None:
+            from .frozen import FrozenMarkovGraph
+            self._compiled_copy = FrozenMarkovGraph.from_graph(self)
+        return self._compiled_copy
 
     def node_id_by_tokens(self, tokens):
-        key = self._node_key_from_tokens(tokens)
+        key = self._lookup_key_from_tokens(tokens)
         if key not in self.toks:
             raise Exception("No node with such tokens footprint")
         return self.toks[key]
@@ -270,14 +629,153 @@ class MarkovGraph(Graph):
     def end_node_id(self,):
         return self.node_id_by_tokens(self.END_CONTEXT)
 
+    def score(self, sentences, smoothing=SMOOTHING):
+        """Yields ``(log_prob, transitions)`` for each of ``sentences``: the
+        natural log-probability of its tokens then the end token under the
+        chain and the number of transitions it took. Each transition is
+        smoothed additively over the vocabulary (plus one outcome for unknown
+        tokens), see ``tools.additive_log_prob``; unknown contexts get a
+        uniform distribution.
+        """
+        lookup = lambda token: self.vocab.id_of(token, -1)
+        toks, succ = self.toks, self.succ
+        totals = {}
+        def transition_keys(sentence):
+            return self._transition_keys(self._contexts_by_sentence(sentence, lookup),
+                                         self.END_ID)
+        def transition_counts(key):
+            node = toks.get(key[0])
+            if node is None:
+                return 0, 0
+            nbrs = succ[node]
+            total = totals.get(node)
+            if total is None:
+                total = totals[node] = sum(packed >> 1 for packed in six.itervalues(nbrs))
+            return nbrs.get(toks.get(key[1]), 0) >> 1, total
+        return score_sentences(sentences, transition_keys, transition_counts,
+                               smoothing, len(self.vocab))
+
+    def memory_usage(self):
+        """Approximate number of bytes held by the graph structures"""
+        return deep_sizeof((self.succ, self.toks, self.contexts,
+                            self.vocab.ids, self.vocab.tokens))
+
+    # per item costs of ``memory_usage``, fitted on the Tao corpus and
+    # synthetic corpora for orders 1 to 5 (within 10%)
+    NODE_BYTES = 320
+    CONTEXT_TOKEN_BYTES = 14
+    EDGE_BYTES = 14
+    TOKEN_BYTES = 120
+
+    def estimated_memory(self):
+        """Same as ``memory_usage`` from the node, edge and token counts,
+        in constant time
+        """
+        return (len(self.succ) * (self.NODE_BYTES + self.CONTEXT_TOKEN_BYTES * self.order)
+                + self.edge_total * self.EDGE_BYTES + len(self.vocab) * self.TOKEN_BYTES)
+
+    def prune(self, min_count, strict=False):
+        """Removes the edges seen less than ``min_count`` times, except the
+        most frequent one of each node unless ``strict``, then the nodes left
+        off every path from the root to the end node, and renumbers the
+        remaining nodes and tokens in their current order. Returns the
+        ``stats`` before and after, and the fraction kept. Strict pruning
+        that would leave no path from the root to the end raises instead.
+        """
+        before = self.stats()
+        order, succ = self.order, self.succ
+        num_nodes = len(succ)
+        root = self.toks.get(tuple([self.START_ID]*order))
+        end = self.toks.get(tuple([self.END_ID]*order))
+        if strict and root is not None and end is not None:
+            reached, stack = bytearray(num_nodes), [root]
+            reached[root] = 1
+            while stack and not reached[end]:
+                for nbr, packed in six.iteritems(succ[stack.pop()]):
+                    if packed >> 1 >= min_count and not reached[nbr]:
+                        reached[nbr] = 1
+                        stack.append(nbr)
+            if not reached[end]:
+                raise Exception("strict pruning at %d would leave no path from the "
+                                "start to the end of a sentence"%min_count)
+        for node in six.moves.range(num_nodes):
+            nbrs = succ[node]
+            if not nbrs:
+                continue
+            threshold = min_count if strict else min(min_count, max(six.itervalues(nbrs)) >> 1)
+            succ[node] = {nbr: packed for nbr, packed in six.iteritems(nbrs)
+                          if packed >> 1 >= threshold}
+
+        # nodes reachable from the root, then the ones of those reaching the end
+        alive = bytearray(num_nodes)
+        if root is not None and end is not None:
+            reached, stack = bytearray(num_nodes), [root]
+            reached[root] = 1
+            preds = {}
+            while stack:
+                node = stack.pop()
+                for nbr in succ[node]:
+                    preds.setdefault(nbr, []).append(node)
+                    if not reached[nbr]:
+                        reached[nbr] = 1
+                        stack.append(nbr)
+            stack = [end] if reached[end] else []
+            alive[end] = alive[root] = 1
+            while stack:
+                for pred in preds.get(stack.pop(), ()):
+                    if not alive[pred]:
+                        alive[pred] = 1
+                        stack.append(pred)
+            preds = None
+
+        contexts, tokens = self.contexts, self.vocab.tokens
+        node_ids = array('i', [-1]) * num_nodes
+        used = bytearray(len(tokens))
+        used[self.START_ID] = used[self.END_ID] = 1
+        num_alive = 0
+        for node in six.moves.range(num_nodes):
+            if alive[node]:
+                node_ids[node] = num_alive
+                num_alive += 1
+                for token_id in contexts[node*order:(node+1)*order]:
+                    used[token_id] = 1
+        token_ids = array('i', [-1]) * len(tokens)
+        vocab = Vocabulary()
+        for token_id, token in enumerate(tokens):
+            if used[token_id]:
+                token_ids[token_id] = vocab.intern(token)
+
+        self.vocab, self.succ, self.toks = vocab, [], {}
+        self.contexts = array('i')
+        self.edge_total = self.transition_total = 0
+        for node in six.moves.range(num_nodes):
+            nbrs, succ[node] = succ[node], None
+            if not alive[node]:
+                continue
+            key = tuple(token_ids[token_id] for token_id in contexts[node*order:(node+1)*order])
+            self.toks[key] = len(self.succ)
+            self.contexts.extend(key)
+            nbrs = {node_ids[nbr]: packed for nbr, packed in six.iteritems(nbrs)
+                    if alive[nbr]}
+            self.succ.append(nbrs)
+            self.edge_total += len(nbrs)
+            self.transition_total += sum(packed >> 1 for packed in six.itervalues(nbrs))
+        self.adj = self.succ
+        self.samplers = self._pred = self._compiled_copy = None
+
+        after = self.stats()
+        kept = {key: after[key] * 1.0 / before[key] if before[key] else 1.0
+                for key in before}
+        return {"min_count": min_count, "before": before, "after": after, "kept": kept}
+
     def _path_to_edges(self, path):
+        token = self.vocab.token
         for pred, succ in six.moves.zip(path[:-1], path[1:]):
-            ptoken = self.node[pred][self.last_token_key]
-            stoken = self.node[succ][self.last_token_key]
-            if ptoken != self.END_TOKEN or stoken != self.END_TOKEN:
-                yield self.node[pred][self.last_token_key],\
-                    self.node[succ][self.last_token_key],\
-                    self.get_edge(pred, succ)["has_space"]
+            ptoken = self.last_token_id(pred)
+            stoken = self.last_token_id(succ)
+            if ptoken != self.END_ID or stoken != self.END_ID:
+                yield token(ptoken), token(stoken),\
+                    bool(self.succ[pred][succ] & 1)
 
     def _path_to_string(self, path):
         edges = self._path_to_edges(path)
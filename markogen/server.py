@@ -0,0 +1,122 @@
+"""Local generation server.
+
+A ``GenerationServer`` keeps a compiled ``MarkovGenerator`` in memory and
+answers requests sent over TCP, one JSON object per line::
+
+    {"n": 2, "max_len": 80}
+
+and replies with one JSON line per request::
+
+    {"sentences": ["...", "..."], "latency_ms": 0.8}
+
+Requests received while a batch is being generated are queued and
+answered together in the next batch.
+"""
+import asyncio
+import json
+import logging
+import time
+
+log = logging.getLogger('markov')
+
+class GenerationServer(object):
+    """"""
+    def __init__(self, generator, max_len=150, concurrency=64,
+                 max_batch=32, max_sentences=1000):
+        # compile the model and build its length tables up front
+        list(generator.generate(1, max_len))
+        self.generator = generator
+        self.max_len = max_len
+        self.concurrency = concurrency
+        self.max_batch = max_batch
+        self.max_sentences = max_sentences
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Starts listening. Returns the ``(host, port)`` actually bound."""
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.batcher = asyncio.ensure_future(self._batch_loop())
+        self.server = await asyncio.start_server(self._handle_client, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self, host="127.0.0.1", port=0):
+        host, port = await self.start(host, port)
+        log.info("serving on %s:%d", host, port)
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._answer(line)
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def _parse(self, line):
+        request = json.loads(line.decode("utf-8")) if line.strip() else {}
+        if not isinstance(request, dict):
+            raise Exception("a request must be a JSON object")
+        num_sentences = int(request.get("n", 1))
+        max_len = int(request.get("max_len", self.max_len))
+        if not 0 < num_sentences <= self.max_sentences:
+            raise Exception("n has to be between 1 and %d"%self.max_sentences)
+        return num_sentences, max_len
+
+    async def _answer(self, line):
+        started = time.time()
+        try:
+            request = self._parse(line)
+            # at most ``concurrency`` requests are queued or in generation
+            async with self.slots:
+                future = asyncio.get_event_loop().create_future()
+                await self.queue.put((request, future))
+                sentences = await future
+        except Exception as e:
+            return {"error": str(e)}
+        latency_ms = (time.time() - started) * 1000
+        log.debug("answered %d sentences in %.2fms", len(sentences), latency_ms)
+        return {"sentences": sentences, "latency_ms": latency_ms}
+
+    async def _batch_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            requests = [request for request, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self._generate, requests)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # fail the whole batch rather than leave its clients waiting
+                log.exception("batch of %d requests failed", len(batch))
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _generate(self, requests):
+        """Answers a batch of ``(num_sentences, max_len)`` requests"""
+        results = []
+        for num_sentences, max_len in requests:
+            try:
+                results.append(list(self.generator.generate(num_sentences, max_len)))
+            except Exception as e:
+                results.append(e)
+        return results
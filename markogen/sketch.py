@@ -0,0 +1,152 @@
+"""Approximate transition counting for corpora too large for exact counts.
+
+``SketchMarkovGraph`` counts transitions in a fixed-size count-min sketch
+and only keeps, for each context, its ``heavy_hitters`` most frequent
+successors, weighted by their sketch estimates. Edge memory is bounded by
+the number of contexts instead of the number of distinct transitions; the
+contexts and the vocabulary are still stored in full.
+"""
+from array import array
+from random import Random
+import sys
+
+import six
+
+from .models import (MarkovGraph, Vocabulary)
+
+WIDTH = 1 << 18
+DEPTH = 4
+HEAVY_HITTERS = 8
+# counters saturate at the largest value of an unsigned 32-bit cell
+MAX_COUNT = (1 << 32) - 1
+PRIME = (1 << 61) - 1
+
+class CountMinSketch(object):
+    """``depth`` rows of ``width`` counters, each row indexed by its own
+    hash of the integer key. Estimates are never below the true count.
+    Updates are conservative: only the counters at the current minimum are
+    raised, which keeps collisions from inflating the other rows.
+    """
+    def __init__(self, width=WIDTH, depth=DEPTH, seed=0):
+        self.width = width
+        self.depth = depth
+        rng = Random(seed)
+        self.hashes = [(rng.randrange(1, PRIME), rng.randrange(PRIME), row*width)
+                       for row in six.moves.range(depth)]
+        self.table = array('I', [0]) * (width * depth)
+
+    def _cells(self, key):
+        width = self.width
+        return [offset + (a * key + b) % PRIME % width for a, b, offset in self.hashes]
+
+    def add(self, key, count=1):
+        """Adds ``count`` to ``key`` and returns its new estimate"""
+        table = self.table
+        cells = self._cells(key)
+        estimate = min(min(table[cell] for cell in cells) + count, MAX_COUNT)
+        for cell in cells:
+            if table[cell] < estimate:
+                table[cell] = estimate
+        return estimate
+
+    def estimate(self, key):
+        table = self.table
+        return min(table[cell] for cell in self._cells(key))
+
+    def memory_usage(self):
+        return sys.getsizeof(self.table)
+
+
+class SketchMarkovGraph(MarkovGraph):
+    """``MarkovGraph`` whose transition counts are kept in a
+    ``CountMinSketch``. ``succ[node]`` only holds the candidate successors
+    of the node, at most ``heavy_hitters`` of them, with their estimated
+    count packed as in ``MarkovGraph``. A new successor replaces the weakest
+    candidate once its estimate is higher.
+
+    ``edge_total`` counts the candidate edges; ``transition_total`` is the
+    exact number of transitions learnt.
+    """
+    def __init__(self, order, width=WIDTH, depth=DEPTH,
+                 heavy_hitters=HEAVY_HITTERS, **attr):
+        super(SketchMarkovGraph, self).__init__(order, **attr)
+        if heavy_hitters < 1:
+            raise Exception("heavy_hitters has to be a strictly positive integer")
+        self.sketch = CountMinSketch(width, depth)
+        self.heavy_hitters = heavy_hitters
+
+    def add_edge_count(self, pred, succ, count, attr_dict=None, **attrs):
+        if attr_dict is not None:
+            attrs = dict(attr_dict, **attrs)
+        self.samplers = self._pred = self._compiled_copy = None
+        self.transition_total += count
+        sketch = self.sketch
+        estimate = sketch.add(pred << 32 | succ, count)
+        nbrs = self.succ[pred]
+        packed = nbrs.get(succ)
+        has_space = bool(attrs.get("has_space", packed & 1 if packed else False))
+        if packed is None and len(nbrs) >= self.heavy_hitters:
+            weakest = min(nbrs, key=nbrs.get)
+            # the stored estimates may be stale, the sketch only grows
+            if sketch.estimate(pred << 32 | weakest) >= estimate:
+                return
+            del nbrs[weakest]
+            self.edge_total -= 1
+        if packed is None:
+            self.edge_total += 1
+        nbrs[succ] = estimate << 1 | has_space
+
+    def add_transition_counts(self, counts, tokens=None):
+        if tokens is not None:
+            ids = [self.vocab.intern(token) for token in tokens]
+            translate = lambda key: tuple(ids[token_id] for token_id in key)
+        for (prev, curr), (count, has_space) in six.iteritems(counts):
+            if tokens is not None:
+                prev, curr = translate(prev), translate(curr)
+            self.add_edge_count(self._add_context_node(prev),
+                                self._add_context_node(curr), count, has_space=has_space)
+
+    def refresh(self):
+        """Updates the candidate counts to their current sketch estimates"""
+        estimate = self.sketch.estimate
+        for node, nbrs in enumerate(self.succ):
+            for succ, packed in six.iteritems(nbrs):
+                nbrs[succ] = estimate(node << 32 | succ) << 1 | packed & 1
+        self.samplers = self._pred = self._compiled_copy = None
+
+    def freeze(self):
+        self.refresh()
+        return super(SketchMarkovGraph, self).freeze()
+
+    def heavy_graph(self):
+        """Returns an exact ``MarkovGraph`` holding the candidate edges with
+        their estimated counts, without the contexts a walk could enter but
+        not leave (their exits may all have been evicted).
+        """
+        self.refresh()
+        graph = MarkovGraph(order=self.order)
+        graph.tokenizer = self.tokenizer
+        graph.vocab = Vocabulary(self.vocab.tokens)
+        graph.toks = dict(self.toks)
+        graph.contexts = array('i', self.contexts)
+        graph.succ[:] = [dict(nbrs) for nbrs in self.succ]
+        graph.edge_total = self.edge_total
+        graph.transition_total = sum(packed >> 1 for nbrs in graph.succ
+                                     for packed in six.itervalues(nbrs))
+        graph.prune(1)
+        return graph
+
+    def prune(self, min_count, strict=False):
+        raise Exception("sketch graphs cannot be pruned, their memory is "
+                        "bounded by width, depth and heavy_hitters")
+
+    def memory_usage(self):
+        return super(SketchMarkovGraph, self).memory_usage() + self.sketch.memory_usage()
+
+    def estimated_memory(self):
+        return super(SketchMarkovGraph, self).estimated_memory() + self.sketch.memory_usage()
+
+    def stats(self):
+        stats = super(SketchMarkovGraph, self).stats()
+        stats["sketch_bytes"] = self.sketch.memory_usage()
+        return stats
@@ -0,0 +1,152 @@
+"""Versioned binary format for ``FrozenMarkovGraph``.
+
+The file is a fixed header followed by sections padded to 8 bytes::
+
+    header       MAGIC, version, byte order, flags, order, sizes, root/end nodes
+    names        tokenizer and sentence tokenizer class names (utf-8)
+    token index  int64 x (num_tokens + 1), offsets into the token blob
+    token blob   utf-8 encoded tokens
+    contexts     int32 x (num_nodes * order)
+    offsets      int64 x (num_nodes + 1)
+    targets      int32 x num_edges
+    cumulative   int64 x num_edges
+    spaces       (num_edges + 7) // 8 bytes of packed has_space flags
+    min chars    int64 x num_nodes  \
+    needs        int64 x num_edges   | length tables, if flags has LENGTH_TABLES
+    row needs    int64 x num_nodes  /
+
+The length tables (see ``FrozenMarkovGraph._length_tables``) are computed
+when the model is written, so that generating from a loaded model does not
+start with a pass over the whole graph. Files without them still load, the
+tables are then built on first use.
+
+Arrays are written in native byte order and loaded as memoryviews over
+a read-only ``mmap``, so loading copies nothing and processes opening the
+same model share its pages.
+"""
+from array import array
+import mmap
+import os
+import struct
+import sys
+
+from .frozen import FrozenMarkovGraph
+
+MAGIC = b"MKGN"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIcBxxIIqqqqqIq")
+LENGTH_TABLES = 1
+BYTE_ORDER = b"<" if sys.byteorder == "little" else b">"
+
+class MappedTokens(object):
+    """Read-only token sequence decoded on access from the token blob"""
+    def __init__(self, index, blob):
+        self.index = index
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.index) - 1
+
+    def __getitem__(self, token_id):
+        if token_id < 0 or token_id >= len(self):
+            raise IndexError(token_id)
+        return bytes(self.blob[self.index[token_id]:self.index[token_id+1]]).decode("utf-8")
+
+    def __iter__(self):
+        for token_id in range(len(self)):
+            yield self[token_id]
+
+def _padding(size):
+    return b"\0" * (-size % 8)
+
+def _class_name(cls):
+    return cls.__name__ if cls is not None else ""
+
+def dump(graph, path, sentence_tokenizer_cls=None):
+    """Writes the ``FrozenMarkovGraph`` graph to ``path``. The file is
+    written aside and renamed over ``path``, which leaves a model mapped from
+    it valid and never leaves half a model.
+    """
+    names = b"\0".join([_class_name(graph.tokenizer_cls).encode("utf-8"),
+                        _class_name(sentence_tokenizer_cls).encode("utf-8")])
+    encoded = [token.encode("utf-8") for token in graph.tokens]
+    token_index = array('q', [0])
+    for token in encoded:
+        token_index.append(token_index[-1] + len(token))
+    blob = b"".join(encoded)
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER, LENGTH_TABLES, graph.order,
+                         graph.END_ID, len(encoded), graph.num_nodes(),
+                         graph.num_edges(), graph.root, graph.end,
+                         len(names), len(blob))
+    sections = [names, token_index, blob, graph.contexts, graph.offsets,
+                graph.targets, graph.cumulative, graph.spaces]
+    sections.extend(graph._length_tables())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(_padding(len(header)))
+        for section in sections:
+            data = memoryview(section).cast('B')
+            f.write(data)
+            f.write(_padding(len(data)))
+    os.replace(tmp_path, path)
+
+def load(path):
+    """Maps the model at ``path``. Returns the ``FrozenMarkovGraph`` and the
+    name of the sentence tokenizer class it was trained with.
+    """
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buf = memoryview(mapping)
+    if len(buf) < HEADER.size:
+        raise Exception("%s is not a markogen model"%path)
+    (magic, version, byte_order, flags, order, end_token_id, num_tokens, num_nodes,
+     num_edges, root, end, names_len, blob_len) = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise Exception("%s is not a markogen model"%path)
+    if version != FORMAT_VERSION:
+        raise Exception("unsupported model format version %d"%version)
+    if byte_order != BYTE_ORDER:
+        raise Exception("model was saved with a different byte order")
+
+    pos = HEADER.size + len(_padding(HEADER.size))
+    def section(size, fmt='B'):
+        nbytes = size * struct.calcsize(fmt)
+        data = buf[pos:pos+nbytes]
+        if len(data) != nbytes:
+            raise Exception("truncated model file %s"%path)
+        return data.cast(fmt), pos + nbytes + len(_padding(nbytes))
+
+    names, pos = section(names_len)
+    token_index, pos = section(num_tokens + 1, 'q')
+    blob, pos = section(blob_len)
+    contexts, pos = section(num_nodes * order, 'i')
+    offsets, pos = section(num_nodes + 1, 'q')
+    targets, pos = section(num_edges, 'i')
+    cumulative, pos = section(num_edges, 'q')
+    spaces, pos = section((num_edges + 7) // 8)
+    length_tables = None
+    if flags & LENGTH_TABLES:
+        min_chars, pos = section(num_nodes, 'q')
+        needs, pos = section(num_edges, 'q')
+        row_needs, pos = section(num_nodes, 'q')
+        length_tables = (min_chars, needs, row_needs)
+
+    tokenizer_name, sentence_tokenizer_name = \
+        bytes(names).decode("utf-8").split("\0")
+    graph = FrozenMarkovGraph(order, MappedTokens(token_index, blob), contexts,
+                              offsets, targets, cumulative, spaces, root, end,
+                              end_token_id=end_token_id,
+                              tokenizer_cls=_tokenizer_cls(tokenizer_name),
+                              length_tables=length_tables)
+    return graph, sentence_tokenizer_name
+
+def _tokenizer_cls(name):
+    if not name:
+        return None
+    from . import tokenizers
+    try:
+        return getattr(tokenizers, name)
+    except AttributeError:
+        raise Exception("unknown tokenizer %s"%name)
@@ -9,9 +9,31 @@ except Exception: # python 3
 
 import six
 
+class LazyPattern(object):
+    """Regular expression compiled on first use, so that importing the
+    tokenizers costs nothing. The methods of the compiled pattern are
+    cached on the instance once looked up.
+    """
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled = None
+
+    def compile(self):
+        if self._compiled is None:
+            self._compiled = re.compile(self.pattern, self.flags)
+        return self._compiled
+
+    def __getattr__(self, name):
+        if name.startswith("_"): # copies and unpickled instances
+            raise AttributeError(name)
+        value = getattr(self.compile(), name)
+        setattr(self, name, value)
+        return value
+
 class Tokenizer(object):
     """Doc string"""
-    regex = re.compile(".*")
+    regex = LazyPattern(".*")
 
     @classmethod
     def _process_text(cls, text):
@@ -37,16 +59,24 @@ class Tokenizer(object):
         """alias of ``tokenize``"""
         return self.tokenize(text)
 
+    def split_span(self, text, start, end):
+        """Same as ``split(text[start:end])`` for a region that neither
+        starts nor ends with whitespace, without copying it, except that
+        whitespace tokens are returned as matched instead of as ``u' '``.
+        """
+        return [token.strip() or token for token in self.regex.findall(text, start, end)]
+
     @staticmethod
     def join(words):
         return u"".join(words)
 
 class SentenceTokenizer(Tokenizer):
     """Doc string"""
-    def __init__(self,):
-        """docstring"""
-        self.regex = re.compile(
-            "[^.!?\\s]" # First char is non-punct, non-ws\n" +
+    # characters of an unfinished sentence carried from chunk to chunk by
+    # ``split_stream`` before it is cut at its last whitespace
+    max_carry = 1 << 16
+    regex = LazyPattern(
+        "[^.!?\\s]" # First char is non-punct, non-ws\n" +
 			"[^.!?]*"   # Greedily consume up to punctuation.\n" +
 			"(?:"       # Group for unrolling the loop.\n" +
 			"[.!?]"     # (special) inner punctuation ok if\n" +
@@ -65,16 +95,127 @@ class SentenceTokenizer(Tokenizer):
     def _split_sentences(self, text):
         return super(SentenceTokenizer, self).tokenize(text)
 
+    def _sentence_spans(self, text):
+        """Yields the ``(start, end)`` offsets of the sentences of text"""
+        for match in self.regex.finditer(text):
+            yield match.span()
+
+    def split_stream(self, chunks):
+        """Splits an iterable of text chunks into sentences. Only the text
+        after the last complete sentence of a chunk is carried over to the
+        next one, so memory is bounded by the chunk and sentence sizes.
+        Sentences running over more than ``max_carry`` characters past a
+        chunk are cut, so that they are not scanned again with every chunk.
+        """
+        for text, start, end in self._stream_spans(chunks):
+            yield text[start:end]
+
+    def token_streams(self, chunks, tokenizer):
+        """Same as splitting every sentence of ``split_stream(chunks)``
+        with ``tokenizer``, in a single pass: the tokens of each sentence are
+        matched in place in the text, see ``Tokenizer.split_span``.
+        """
+        split_span = tokenizer.split_span
+        for text, start, end in self._stream_spans(chunks):
+            yield split_span(text, start, end)
+
+    def _stream_spans(self, chunks):
+        """Yields ``(text, start, end)`` for every sentence of the chunks,
+        ``text[start:end]`` being the sentence without surrounding whitespace
+        """
+        carry = u""
+        for chunk in chunks:
+            if type(chunk) != UnicodeType:
+                chunk = six.u(chunk)
+            text = carry + chunk
+            done, last = 0, None
+            for span in self._sentence_spans(text):
+                if last is not None:
+                    yield self._strip_span(text, *last)
+                    done = last[1]
+                last = span
+            # the last sentence may go on in the next chunk
+            carry = text[done:] if last is not None else u""
+            if len(carry) > self.max_carry:
+                cut = len(carry)
+                while cut and not carry[cut-1].isspace():
+                    cut -= 1
+                head, carry = (carry[:cut], carry[cut:]) if cut else (carry, u"")
+                for start, end in self._sentence_spans(head):
+                    yield self._strip_span(head, start, end)
+        for start, end in self._sentence_spans(carry):
+            yield self._strip_span(carry, start, end)
+
+    @staticmethod
+    def _strip_span(text, start, end):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end-1].isspace():
+            end -= 1
+        return text, start, end
+
 class NLTKSentenceTokenizer(SentenceTokenizer):
-    """"""
+    """Sentence splitting with NLTK's Punkt. The Punkt model is built on
+    first use and kept, from the parameters saved at ``params_path`` if
+    given, plus ``abbreviations``. nltk is only imported then.
+    """
+    ABBREVIATIONS = ('dr', 'vs', 'mr', 'mrs', 'prof', 'inc')
+
+    def __init__(self, abbreviations=ABBREVIATIONS, params_path=None):
+        super(NLTKSentenceTokenizer, self).__init__()
+        self.abbreviations = set(abbreviation.lower().rstrip('.')
+                                 for abbreviation in abbreviations)
+        self.params_path = params_path
+        self.params = None
+        self.punkt = None
+
+    def train(self, text):
+        """Learns the Punkt parameters (abbreviations, collocations and
+        sentence starters) of the corpus ``text``, and splits with them from
+        now on.
+        """
+        from nltk.tokenize.punkt import PunktTrainer
+        trainer = PunktTrainer()
+        trainer.train(text, finalize=False)
+        trainer.finalize_training()
+        self.params = trainer.get_params()
+        self.punkt = None
+        return self
+
+    def save(self, path):
+        """Writes the Punkt parameters to ``path``, to be given back as
+        ``params_path``
+        """
+        import pickle
+        with open(path, "wb") as f:
+            pickle.dump(self._params(), f, pickle.HIGHEST_PROTOCOL)
+
+    def _params(self):
+        if self.params is None:
+            if self.params_path is not None:
+                import pickle
+                with open(self.params_path, "rb") as f:
+                    self.params = pickle.load(f)
+            else:
+                from nltk.tokenize.punkt import PunktParameters
+                self.params = PunktParameters()
+        return self.params
+
+    def _splitter(self):
+        if self.punkt is None:
+            from nltk.tokenize.punkt import PunktSentenceTokenizer
+            params = self._params()
+            params.abbrev_types.update(self.abbreviations)
+            self.punkt = PunktSentenceTokenizer(params)
+        return self.punkt
+
     def _split_sentences(self, text):
-        from nltk.tokenize.punkt import PunktSentenceTokenizer, PunktParameters
-        punkt_param = PunktParameters()
-        punkt_param.abbrev_types = set(['dr', 'vs', 'mr', 'mrs', 'prof', 'inc'])
-        sentence_splitter = PunktSentenceTokenizer(punkt_param)
-        sentences = sentence_splitter.tokenize(text)
+        sentences = self._splitter().tokenize(text)
         return sentences
 
+    def _sentence_spans(self, text):
+        return self._splitter().span_tokenize(text)
+
 ######################################################################
 # The following strings are components in the regular expression
 # that is used for tokenizing. It's important that phone_number
@@ -195,18 +336,18 @@ REGEX_TOKENS = (
 ######################################################################
 # This is the core tokenizing regex:
 
-TOKEN_RE = re.compile(r"""(%s)""" % "|".join(REGEX_TOKENS),
+TOKEN_RE = LazyPattern(r"""(%s)""" % "|".join(REGEX_TOKENS),
+                       re.VERBOSE | re.I | re.UNICODE)
+WORD_RE = LazyPattern(r"""(%s)""" % "|".join(REGEX_STRINGS),
                       re.VERBOSE | re.I | re.UNICODE)
-WORD_RE = re.compile(r"""(%s)""" % "|".join(REGEX_STRINGS),
-                     re.VERBOSE | re.I | re.UNICODE)
 
 # The emoticon string gets its own regex so that we can
 # preserve case for them as needed:
-EMOTICON_RE = re.compile(REGEX_STRINGS[1], re.VERBOSE | re.I | re.UNICODE)
+EMOTICON_RE = LazyPattern(REGEX_STRINGS[1], re.VERBOSE | re.I | re.UNICODE)
 
 # These are for regularizing HTML entities to Unicode:
-HTML_ENTITY_DIGIT_RE = re.compile(r"&#\d+;")
-HTML_ENTITY_ALPHA_RE = re.compile(r"&\w+;")
+HTML_ENTITY_DIGIT_RE = LazyPattern(r"&#\d+;")
+HTML_ENTITY_ALPHA_RE = LazyPattern(r"&\w+;")
 AMP = "&amp;"
 
 class HappyTokenizer(Tokenizer):
@@ -242,6 +383,9 @@ class HappyTokenizer(Tokenizer):
     def tokenize(self, s):
         return self._split_tokens(s, WORD_RE)
 
+    def split_span(self, text, start, end):
+        return self.split(text[start:end])
+
     def split(self, text):
         tokens = self._split_tokens(text, TOKEN_RE)
         tokens = [token.strip() if token.strip() != ''
@@ -282,12 +426,12 @@ class HappyTokenizer(Tokenizer):
 class CobeTokenizer(Tokenizer):
     """
     """
-    regex = re.compile(r"(\w+:\S+"  # urls
-                       r"|[\w'-]+"  # words
-                       r"|[^\w\s][^\w]*[^\w\s]"  # multiple punctuation
-                       r"|[^\w\s]"  # a single punctuation character
-                       r"|\s+)",    # whitespace
-                       re.UNICODE)
+    regex = LazyPattern(r"(\w+:\S+"  # urls
+                        r"|[\w'-]+"  # words
+                        r"|[^\w\s][^\w]*[^\w\s]"  # multiple punctuation
+                        r"|[^\w\s]"  # a single punctuation character
+                        r"|\s+)",    # whitespace
+                        re.UNICODE)
     def split(self, phrase):
         tokens = super(CobeTokenizer, self).split(phrase)
         space = u" "
@@ -296,3 +440,8 @@ class CobeTokenizer(Tokenizer):
                 tokens[i] = space
 
         return tokens
+
+    def split_span(self, text, start, end):
+        # only the whitespace alternative of the regex matches whitespace
+        # at either end of a token, so nothing needs stripping
+        return self.regex.findall(text, start, end)
@@ -1,11 +1,24 @@
 
-from random import uniform
+import math
+import sys
+from random import uniform, random, Random
+from bisect import bisect_right
 from collections import deque
 from itertools import islice
 
-def weighted_choice(choices, return_weight=False):
+def make_rng(rng=None):
+    """Returns ``rng`` if it is a random generator (anything with a
+    ``random()`` method, such as ``random.Random`` or a NumPy ``Generator``),
+    else a new ``random.Random`` seeded with it.
+    """
+    if hasattr(rng, "random"):
+        return rng
+    return Random(rng)
+
+
+def weighted_choice(choices, return_weight=False, rng=None):
     total = sum(weight for _, weight in choices)
-    random_val = uniform(0, total)
+    random_val = uniform(0, total) if rng is None else rng.random() * total
     upto = 0
     for choice, weight in choices:
         if upto + weight > random_val:
@@ -14,9 +27,103 @@ def weighted_choice(choices, return_weight=False):
     assert False, "Shouldn't get here"
 
 
+def cumulative_table(choices):
+    """Precompute ``(choices, cumulative)`` from ``(choice, weight)`` pairs
+    for use with ``cumulative_choice``.
+    """
+    items, cumulative = [], []
+    upto = 0
+    for choice, weight in choices:
+        upto += weight
+        items.append(choice)
+        cumulative.append(upto)
+    return tuple(items), tuple(cumulative)
+
+
+def cumulative_choice(items, cumulative, rng=None):
+    """Weighted choice over a table built by ``cumulative_table``, in
+    O(log n) and without allocating. Returns ``(choice, weight)``.
+    """
+    random_val = (random() if rng is None else rng.random()) * cumulative[-1]
+    idx = bisect_right(cumulative, random_val)
+    weight = cumulative[idx] - cumulative[idx-1] if idx else cumulative[0]
+    return items[idx], weight
+
+
+# additive smoothing of the graphs' ``score``: 1 is Laplace smoothing, 0 none
+SMOOTHING = 1.0
+SCORE_BATCH = 10000
+
+def additive_log_prob(transitions, smoothing, num_outcomes):
+    """Natural log-probability of a sequence of ``(count, total)``
+    transitions, each smoothed to ``(count + smoothing) / (total +
+    smoothing * num_outcomes)``. Returns it with the number of transitions;
+    the log-probability is -inf if a transition gets no probability.
+    """
+    log_prob, num_transitions = 0.0, 0
+    for count, total in transitions:
+        num_transitions += 1
+        if count + smoothing <= 0:
+            log_prob = float("-inf")
+        elif log_prob > float("-inf"):
+            log_prob += math.log(count + smoothing) - math.log(total + smoothing * num_outcomes)
+    return log_prob, num_transitions
+
+
+def score_sentences(sentences, transition_keys, transition_counts, smoothing,
+                    num_outcomes, batch_size=SCORE_BATCH):
+    """Yields the ``additive_log_prob`` of each sentence, given the
+    functions mapping a sentence to its transition keys and a key to its
+    ``(count, total)``. Sentences are scored in batches in which each
+    distinct transition is only looked up once.
+    """
+    for batch in batches(sentences, batch_size):
+        seen = {}
+        def transitions(sentence):
+            for key in transition_keys(sentence):
+                counts = seen.get(key)
+                if counts is None:
+                    counts = seen[key] = transition_counts(key)
+                yield counts
+        for sentence in batch:
+            yield additive_log_prob(transitions(sentence), smoothing, num_outcomes)
+
+
 def sliding_window(seq, size=2):
     seq_it = iter(seq)
     result = deque(islice(seq_it, size), maxlen=size)
     while True:
         yield result
-        result.append(next(seq_it))
+        try:
+            result.append(next(seq_it))
+        except StopIteration:
+            return
+
+
+def batches(iterable, size):
+    """Yields lists of ``size`` consecutive items (the last may be shorter)"""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate number of bytes held by ``obj`` and the containers,
+    keys and values it references. Shared objects are counted once.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    return size
@@ -0,0 +1,215 @@
+"""Contexts of every order up to ``max_order`` in one trie, for backoff
+generation and for comparing orders without training a graph per order.
+"""
+from array import array
+
+import six
+
+from .models import (MarkovGraph, Vocabulary)
+from .tools import (cumulative_table, cumulative_choice, deep_sizeof)
+
+MASK = (1 << 32) - 1
+
+class ContextTrie(object):
+    """Trie of contexts read backwards: the children of a context are the
+    contexts one token longer into the past, so the order-n context of a
+    position is found by walking down its last n tokens, and contexts
+    ending the same way share their nodes. Node 0 is the empty context.
+
+    Each node has a child table entry ``children[parent << 32 | token_id]``,
+    its ``parent``, ``token`` and ``depth`` (the order of the context) in
+    arrays and its number of transitions in ``totals``. ``succ[node]`` maps
+    each next token id to the packed ``count << 1 | has_space``, as in
+    ``MarkovGraph``, except for the (many) contexts always followed by the
+    same token: their ``succ`` is the single int ``packed << 32 | token_id``.
+    Use ``successors`` to read either form.
+    """
+    START_TOKEN = MarkovGraph.START_TOKEN
+    END_TOKEN = MarkovGraph.END_TOKEN
+    tokenizer_cls = MarkovGraph.tokenizer_cls
+
+    def __init__(self, max_order):
+        if max_order < 1:
+            raise Exception("max_order has to be a strictly positive integer")
+        self.max_order = max_order
+        self.tokenizer = self.tokenizer_cls()
+        self.vocab = Vocabulary([self.START_TOKEN, self.END_TOKEN])
+        self.START_ID = self.vocab.id_of(self.START_TOKEN)
+        self.END_ID = self.vocab.id_of(self.END_TOKEN)
+        self.children = {}
+        self.parent = array('i', [-1])
+        self.token = array('i', [-1])
+        self.depth = array('B', [0])
+        self.totals = array('q', [0])
+        self.succ = [None]
+        self.samplers = {}
+        self.transition_total = 0
+
+    def _child(self, node, token_id):
+        key = node << 32 | token_id
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = len(self.succ)
+            self.parent.append(node)
+            self.token.append(token_id)
+            self.depth.append(self.depth[node] + 1)
+            self.totals.append(0)
+            self.succ.append(None)
+        return child
+
+    def successors(self, node):
+        """Returns the dict mapping the next token ids of the context to
+        their packed ``count << 1 | has_space``
+        """
+        nbrs = self.succ[node]
+        if nbrs is None:
+            return {}
+        if isinstance(nbrs, dict):
+            return nbrs
+        return {nbrs & MASK: nbrs >> 32}
+
+    def update_by_sentence(self, sentence):
+        self.update_by_token_streams([self.tokenizer.split(sentence)])
+
+    def update_by_token_streams(self, token_streams):
+        """Counts the transitions of every order of sentences already split
+        into tokens, whitespace-only tokens counting as spaces. Returns the
+        number of sentences.
+        """
+        self.samplers = {}
+        intern = self.vocab.intern
+        child, succ, totals = self._child, self.succ, self.totals
+        max_order = self.max_order
+        token_ids = {}
+        known = token_ids.get
+        num_sentences = 0
+        for tokens in token_streams:
+            num_sentences += 1
+            ids, spaces = [self.START_ID]*max_order, []
+            has_space = False
+            for token in tokens:
+                token_id = known(token)
+                if token_id is None:
+                    token_id = token_ids[token] = intern(token) if token.strip() else -1
+                if token_id < 0:
+                    has_space = True
+                    continue
+                ids.append(token_id)
+                spaces.append(has_space)
+                has_space = False
+            ids.append(self.END_ID)
+            spaces.append(has_space)
+
+            for pos in six.moves.range(max_order, len(ids)):
+                token_id, space = ids[pos], spaces[pos - max_order]
+                # the empty context does not know the previous token, and is
+                # drawn from mid-sentence: a token follows a space there if it
+                # ever did, or ever started a sentence
+                empty_space = space or pos == max_order
+                if not empty_space:
+                    packed = self.successors(0).get(token_id)
+                    empty_space = packed is not None and packed & 1
+                node = 0
+                for back in six.moves.range(max_order + 1):
+                    if back:
+                        node = child(node, ids[pos - back])
+                    has_space = space if back else empty_space
+                    nbrs = succ[node]
+                    if nbrs is None:
+                        succ[node] = (2 | has_space) << 32 | token_id
+                    elif nbrs.__class__ is dict:
+                        packed = nbrs.get(token_id, 0)
+                        nbrs[token_id] = ((packed >> 1) + 1) << 1 | has_space
+                    elif nbrs & MASK == token_id:
+                        succ[node] = ((nbrs >> 33) + 1 << 1 | has_space) << 32 | token_id
+                    else:
+                        succ[node] = {nbrs & MASK: nbrs >> 32, token_id: 2 | has_space}
+                    totals[node] += 1
+            self.transition_total += len(ids) - max_order
+        return num_sentences
+
+    def context_node(self, history, max_order=None, min_support=1):
+        """Returns the node of the longest context ending ``history`` (token
+        ids, most recent last) of at most ``max_order`` tokens that was
+        followed at least ``min_support`` times. Falls back to the empty
+        context.
+        """
+        if max_order is None:
+            max_order = self.max_order
+        best = node = 0
+        for back in six.moves.range(1, min(max_order, len(history)) + 1):
+            node = self.children.get(node << 32 | history[-back])
+            if node is None:
+                break
+            if self.totals[node] >= min_support:
+                best = node
+        return best
+
+    def random_step(self, node, rng=None):
+        """Draws a next token id after the context ``node``. Returns it with
+        whether a space comes before it.
+        """
+        nbrs = self.succ[node]
+        if nbrs is None:
+            raise Exception("the context %d has no transition"%node)
+        if nbrs.__class__ is not dict:
+            return nbrs & MASK, bool(nbrs >> 32 & 1)
+        sampler = self.samplers.get(node)
+        if sampler is None:
+            sampler = self.samplers[node] = cumulative_table(
+                (token_id, packed >> 1) for token_id, packed in six.iteritems(nbrs))
+        token_id, _ = cumulative_choice(sampler[0], sampler[1], rng)
+        return token_id, bool(nbrs[token_id] & 1)
+
+    def iter_tokens(self, max_order=None, min_support=1, rng=None):
+        """Yields the rendered fragments (a token and its trailing space) of
+        a sentence, each token drawn after the longest supported context.
+        """
+        history = [self.START_ID]*self.max_order
+        token = None
+        while True:
+            node = self.context_node(history, max_order, min_support)
+            token_id, has_space = self.random_step(node, rng)
+            if token is not None:
+                yield token + " " if has_space else token
+            if token_id == self.END_ID:
+                return
+            token = self.vocab.token(token_id)
+            history.append(token_id)
+            del history[0]
+
+    def context_tokens(self, node):
+        """Returns the tokens of the context, oldest first"""
+        tokens = []
+        while node > 0:
+            tokens.append(self.vocab.token(self.token[node]))
+            node = self.parent[node]
+        return tuple(tokens)
+
+    def num_nodes(self, order=None):
+        if order is None:
+            return len(self.succ)
+        return sum(1 for depth in self.depth if depth == order)
+
+    def num_edges(self, unique=True):
+        """number of (context, next token) pairs, or of transitions learnt
+        if not ``unique``
+        """
+        if unique:
+            return sum(len(nbrs) if isinstance(nbrs, dict) else int(nbrs is not None)
+                       for nbrs in self.succ)
+        return self.transition_total
+
+    def stats(self):
+        """Size of the trie, with the number of contexts of each order"""
+        nodes_by_order = [0] * (self.max_order + 1)
+        for depth in self.depth:
+            nodes_by_order[depth] += 1
+        return {"nodes": self.num_nodes(), "nodes_by_order": nodes_by_order,
+                "edges": self.num_edges(), "transitions": self.transition_total,
+                "tokens": len(self.vocab)}
+
+    def memory_usage(self):
+        """Approximate number of bytes held by the trie structures"""
+        return deep_sizeof((self.children, self.parent, self.token, self.depth,
+                            self.totals, self.succ, self.vocab.ids, self.vocab.tokens))
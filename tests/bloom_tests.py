@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from markogen.bloom import BloomFilter, OriginalityFilter
+from markogen.generators import MarkovGenerator, ORIGINALITY_SUFFIX
+from markogen.tokenizers import CobeTokenizer
+from .generators_tests import read_tao
+
+class testBloomFilter(unittest.TestCase):
+    def test_membership(self):
+        bloom = BloomFilter.for_capacity(1000, 0.01)
+        self.assertEqual(bloom.num_hashes, 7)
+        items = [("item %d"%i).encode("utf-8") for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(1 for i in range(10000)
+                              if ("other %d"%i).encode("utf-8") in bloom)
+        self.assertTrue(false_positives < 300)
+        self.assertTrue(0.001 < bloom.false_positive_rate() < 0.03)
+        set_bits = sum(bin(byte).count("1") for byte in bloom.bits)
+        self.assertEqual(bloom.set_bits, set_bits)
+        loaded = BloomFilter(bloom.num_bits, bloom.num_hashes, bytearray(bloom.bits))
+        self.assertEqual(loaded.false_positive_rate(), bloom.false_positive_rate())
+
+class testOriginalityFilter(unittest.TestCase):
+    def test_sentences(self):
+        originality = OriginalityFilter(CobeTokenizer(), capacity=100)
+        originality.record(u"I love your cat.")
+        self.assertTrue(originality.copies(u"I love your cat."))
+        self.assertTrue(originality.copies(u"I  love your cat ."))
+        self.assertFalse(originality.copies(u"I love your dog."))
+        self.assertFalse(originality.copies(u"I love your cat"))
+
+    def test_windows(self):
+        originality = OriginalityFilter(CobeTokenizer(), window=3, capacity=100)
+        originality.record(u"I love your cat, not you.")
+        self.assertTrue(originality.copies(u"Do you know your cat, dear?"))
+        self.assertFalse(originality.copies(u"Do you know your dog, dear?"))
+        self.assertFalse(originality.copies(u"I love"))
+        # sentences shorter than a window are recorded whole
+        originality.record(u"Hi.")
+        self.assertTrue(originality.copies(u"Hi."))
+        self.assertEqual(originality.stats()["items"], 7)
+
+class testOriginalGeneration(unittest.TestCase):
+    def setUp(self):
+        self.text = read_tao()
+        self.generator = MarkovGenerator(3, rng=0, originality=True)
+        self.generator.learn(self.text)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_no_copies(self):
+        corpus = set(self.generator.set_tokenizer.split(self.text))
+        sentences = list(self.generator.generate(100, 150))
+        self.assertFalse(corpus.intersection(sentences))
+        report = self.generator.generation_report
+        self.assertTrue(report["copies"] > 0)
+        self.assertEqual(report["sentences"], 100)
+        self.assertRaises(Exception, MarkovGenerator, 3, originality=4)
+
+    def test_given_filter(self):
+        originality = OriginalityFilter(CobeTokenizer(), window=5, capacity=1000)
+        generator = MarkovGenerator(3, originality=originality)
+        self.assertTrue(generator.originality is originality)
+        generator.learn(u"I love your cat, not you and me.")
+        self.assertTrue(originality.copies(u"Your cat, not you and the dog."))
+        self.assertRaises(Exception, MarkovGenerator, 3,
+                          originality=OriginalityFilter(CobeTokenizer(), window=4))
+
+    def test_capacity(self):
+        small = MarkovGenerator(3, originality=5, originality_capacity=100)
+        large = MarkovGenerator(3, originality=5, originality_capacity=10000,
+                                originality_error_rate=0.0001)
+        for generator in (small, large):
+            generator.learn(self.text)
+        self.assertTrue(small.stats()["originality"]["false_positive_rate"] > 0.5)
+        self.assertTrue(large.stats()["originality"]["false_positive_rate"] < 0.01)
+
+    def test_same_filter(self):
+        bits = self.generator.originality.bloom.bits
+        for learn in ("learn_bulk", "learn_parallel"):
+            generator = MarkovGenerator(3, originality=True)
+            getattr(generator, learn)(self.text)
+            self.assertEqual(generator.originality.bloom.bits, bits)
+
+    def test_save(self):
+        path = os.path.join(self.tmpdir, "model.bin")
+        self.generator.save(path)
+        loaded = MarkovGenerator.load(path)
+        self.assertEqual(loaded.originality.bloom.bits, self.generator.originality.bloom.bits)
+        self.assertEqual(loaded.originality.window, None)
+        self.assertEqual(len(list(loaded.generate(20, 150))), 20)
+
+        MarkovGenerator(3).save(path)
+        self.assertFalse(os.path.exists(path + ORIGINALITY_SUFFIX))
+        self.assertEqual(MarkovGenerator.load(path).originality, None)
@@ -0,0 +1,135 @@
+import random
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from markogen.models import MarkovGraph
+from markogen.frozen import FrozenMarkovGraph
+from markogen.generators import MarkovGenerator
+
+SENTENCES = ["i love your puppy", "i love your cat", "i love your cat.",
+             "your cat loves me, not you"]
+
+class testFrozenMarkovGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = MarkovGraph(order=2)
+        for sentence in SENTENCES:
+            self.graph.update_by_sentence(sentence)
+        self.frozen = FrozenMarkovGraph.from_graph(self.graph)
+
+    def test_same_edges(self):
+        g, f = self.graph, self.frozen
+        self.assertEqual(f.num_nodes(), g.num_nodes())
+        self.assertEqual(f.num_edges(), g.num_edges())
+        self.assertEqual(f.num_edges(unique=False), g.num_edges(unique=False))
+        for node in range(g.num_nodes()):
+            self.assertEqual(f.node_tokens(node), g.node_tokens(node))
+            self.assertEqual(sorted(f.successors(node)), sorted(g.successors(node)))
+            for _, succ, datadict in g.out_edges_iter(node):
+                self.assertEqual(f.get_edge(node, succ), datadict)
+        self.assertEqual(f.edge_count(g.root_node_id(), g.end_node_id()), 0)
+        self.assertEqual(f.root_node_id(), g.root_node_id())
+        self.assertEqual(f.end_node_id(), g.end_node_id())
+
+    def test_random_walk(self):
+        root, end = self.frozen.root_node_id(), self.frozen.end_node_id()
+        for _ in range(50):
+            path = next(self.frozen.random_walk(root, end))
+            self.assertEqual(path[-1], end)
+            phrase = self.frozen._path_to_string(path)
+            self.assertEqual(phrase, self.graph._path_to_string(path))
+
+    def test_iter_tokens(self):
+        root, end = self.frozen.root_node_id(), self.frozen.end_node_id()
+        for max_len in (None, 25):
+            for seed in range(20):
+                random.seed(seed)
+                phrase = self.frozen._path_to_string(next(self.frozen.random_walk(root, end, max_len)))
+                random.seed(seed)
+                fragments = list(self.frozen.iter_tokens(root, end, max_len))
+                self.assertEqual("".join(fragments), phrase)
+                self.assertTrue(len(fragments) > 1)
+
+    def test_random_step(self):
+        node = self.graph.node_id_by_tokens(["love", "your"])
+        cat = self.graph.node_id_by_tokens(["your", "cat"])
+        SAMPLES = 30000
+        hits = sum(1 for _ in range(SAMPLES) if self.frozen.random_step(node)[0] == cat)
+        self.assertAlmostEqual(2.0/3, hits*1.0/SAMPLES, 1)
+
+    def test_thaw(self):
+        thawed = self.frozen.thaw()
+        self.assertEqual(thawed.toks, self.graph.toks)
+        self.assertEqual(thawed.succ, self.graph.succ)
+        thawed.update_by_sentence("i love you")
+        self.assertEqual(thawed.num_nodes(), self.graph.num_nodes() + 1)
+
+    def test_token_index(self):
+        g, f = self.graph, self.frozen
+        cat = f.token_id("cat")
+        self.assertEqual(sorted(f.nodes_ending_with([cat])),
+                         sorted(node for node in range(g.num_nodes())
+                                if g.node_tokens(node)[-1] == "cat"))
+        self.assertEqual(f.nodes_ending_with([f.token_id("your"), cat]),
+                         [g.node_id_by_tokens(["your", "cat"])])
+        self.assertEqual(f.token_id("dog"), None)
+        self.assertRaises(Exception, f.nodes_ending_with, [cat]*3)
+
+        path = f.path_from_root([f.token_id(token) for token in ("i", "love", "your")])
+        self.assertEqual(path[-1], g.node_id_by_tokens(["love", "your"]))
+        self.assertEqual(f._path_to_string(path), "i love ")
+        self.assertEqual(f.path_from_root([f.token_id("love")]), None)
+
+    def test_random_path_to(self):
+        g, f = self.graph, self.frozen
+        node = g.node_id_by_tokens(["your", "cat"])
+        self.assertEqual(f.in_count(node), 3)
+        paths = set(tuple(f.random_path_to(node)) for _ in range(100))
+        self.assertEqual(set(f._path_to_string(path) for path in paths),
+                         set(["i love your ", "your "]))
+
+class testCompiledGenerator(unittest.TestCase):
+    def test_compile(self):
+        generator = MarkovGenerator(2)
+        generator.learn(" ".join(s + "." for s in SENTENCES))
+        report = generator.compile()
+        self.assertTrue(isinstance(generator.graph, FrozenMarkovGraph))
+        self.assertLess(report["after"], report["before"])
+        self.assertEqual(len(list(generator.generate(5))), 5)
+        generator.learn("Your puppy loves me.")
+        self.assertTrue(isinstance(generator.graph, MarkovGraph))
+        self.assertEqual(len(list(generator.generate(5))), 5)
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class testBatchGeneration(unittest.TestCase):
+    def setUp(self):
+        self.generator = MarkovGenerator(2)
+        self.generator.learn(u"I love your cat. I love your dog, not you. "
+                             u"I love your cat. Your cat loves me.")
+
+    def test_generate_batch(self):
+        sentences = self.generator.generate_batch(3000, seed=42)
+        self.assertEqual(len(sentences), 3000)
+        self.assertEqual(set(sentences), set([u"I love your cat.",
+                                              u"I love your dog, not you.",
+                                              u"Your cat loves me."]))
+        cats = sentences.count(u"I love your cat.")
+        self.assertAlmostEqual(0.5, cats/3000.0, 1)
+
+    def test_seed(self):
+        self.assertEqual(self.generator.generate_batch(50, seed=1),
+                         self.generator.generate_batch(50, seed=1))
+
+    def test_max_len(self):
+        sentences = self.generator.generate_batch(200, max_len=20, seed=3)
+        self.assertEqual(set(sentences), set([u"I love your cat.",
+                                              u"Your cat loves me."]))
+
+    def test_first_order(self):
+        generator = MarkovGenerator(1)
+        generator.learn(u"A b. C b c.")
+        self.assertEqual(set(generator.generate_batch(2000, seed=0)),
+                         set([u"A b.", u"A b c.", u"C b c.", u"C b."]))
@@ -0,0 +1,277 @@
+import io
+import math
+import os.path
+import random
+import unittest
+from sys import maxsize as MAX_INT
+
+from markogen.generators import MarkovGenerator
+
+TAO = os.path.join(os.path.dirname(__file__), "..", "inputs", "tao.txt")
+
+def read_tao():
+    with io.open(TAO, encoding="utf-8") as f:
+        return f.read()
+
+class testMarkovGenerator(unittest.TestCase):
+    def assertSameGraph(self, graph, expected):
+        self.assertEqual(graph.vocab.tokens, expected.vocab.tokens)
+        self.assertEqual(graph.toks, expected.toks)
+        self.assertEqual(graph.succ, expected.succ)
+
+    def test_learn_file(self):
+        expected = MarkovGenerator(2)
+        num_sentences = expected.learn(read_tao())
+        generator = MarkovGenerator(2)
+        self.assertEqual(generator.learn_file(TAO, chunk_size=1000), num_sentences)
+        self.assertSameGraph(generator.graph, expected.graph)
+
+    def test_learn_bulk(self):
+        text = read_tao()
+        for order in (1, 2, 4):
+            expected = MarkovGenerator(order)
+            num_sentences = expected.learn(text)
+            generator = MarkovGenerator(order)
+            self.assertEqual(generator.learn_bulk(text), num_sentences)
+            self.assertSameGraph(generator.graph, expected.graph)
+        generator.learn_bulk(u"A new sentence, and a new word.")
+        expected.learn(u"A new sentence, and a new word.")
+        self.assertSameGraph(generator.graph, expected.graph)
+
+    def test_learn_parallel(self):
+        text = read_tao()
+        for order in (1, 3):
+            expected = MarkovGenerator(order)
+            num_sentences = expected.learn(text)
+            generator = MarkovGenerator(order)
+            self.assertEqual(generator.learn_parallel(text, workers=3, batch_size=50),
+                             num_sentences)
+            self.assertSameGraph(generator.graph, expected.graph)
+            for node, nbrs in enumerate(generator.graph.succ):
+                self.assertEqual(list(nbrs), list(expected.graph.succ[node]))
+
+    def test_learn_parallel_files(self):
+        expected = MarkovGenerator(2)
+        expected.learn_file(TAO)
+        expected.learn_file(TAO)
+        generator = MarkovGenerator(2)
+        generator.learn_parallel([TAO, TAO], workers=2)
+        self.assertSameGraph(generator.graph, expected.graph)
+
+    def test_learn_stream(self):
+        generator = MarkovGenerator(2)
+        count = generator.learn_stream([u"I love your pup", u"py. I love", u" your cat"])
+        self.assertEqual(count, 2)
+        self.assertEqual(set(generator.generate(20)),
+                         set([u"I love your puppy.", u"I love your cat"]))
+
+class testLengthAwareGeneration(unittest.TestCase):
+    def setUp(self):
+        self.generator = MarkovGenerator(2)
+        self.generator.learn(read_tao())
+
+    def test_max_len(self):
+        for max_len in (10, 25, 60):
+            sentences = list(self.generator.generate(300, max_len))
+            self.assertEqual(len(sentences), 300)
+            self.assertTrue(all(len(sentence) < max_len for sentence in sentences))
+            self.assertEqual(self.generator.generation_report,
+                             {"sentences": 300, "rejections": 0, "retries": 0,
+                              "copies": 0})
+
+    def test_min_chars(self):
+        self.generator.compile()
+        graph = self.generator.graph
+        min_chars, _, _ = graph._length_tables()
+        self.assertEqual(min_chars[graph.end_node_id()], 0)
+        shortest = min_chars[graph.root_node_id()]
+        self.assertRaises(Exception, list, self.generator.generate(1, shortest))
+        sentences = list(self.generator.generate(20, shortest + 1))
+        self.assertTrue(all(len(sentence) == shortest for sentence in sentences))
+
+    def test_generate_stream(self):
+        fragments = list(self.generator.generate_stream(40))
+        self.assertTrue(len(fragments) > 1)
+        self.assertTrue(len(u"".join(fragments)) < 40)
+        self.assertRaises(Exception, list, self.generator.generate_stream(2))
+
+    def test_rejection(self):
+        sentences = list(self.generator.generate(20, 30, length_aware=False))
+        self.assertTrue(all(len(sentence) < 30 for sentence in sentences))
+        report = self.generator.generation_report
+        self.assertEqual(report["sentences"], 20)
+        self.assertTrue(report["rejections"] >= report["retries"] > 0)
+        self.assertRaises(Exception, list,
+                          self.generator.generate(5, 12, length_aware=False, max_attempts=1))
+
+class testPrefixGeneration(unittest.TestCase):
+    def setUp(self):
+        self.generator = MarkovGenerator(2, rng=0)
+        self.generator.learn(read_tao())
+
+    def test_prefix(self):
+        sentences = list(self.generator.generate(50, 80, prefix=u"The sage"))
+        self.assertTrue(all(sentence.startswith(u"The sage") for sentence in sentences))
+        self.assertTrue(all(len(sentence) < 80 for sentence in sentences))
+        self.assertRaises(Exception, list, self.generator.generate(1, prefix=u"sage The"))
+        self.assertRaises(Exception, list, self.generator.generate(1, prefix=u"The unicorn"))
+        self.assertRaises(Exception, list, self.generator.generate(1, 10, prefix=u"The sage"))
+
+    def test_contains(self):
+        for words in (u"water", u"muddy water"):
+            sentences = list(self.generator.generate(50, 100, contains=words))
+            self.assertTrue(all(words in sentence for sentence in sentences))
+            self.assertTrue(all(len(sentence) < 100 for sentence in sentences))
+            self.assertEqual(self.generator.generation_report["sentences"], 50)
+        self.assertRaises(Exception, list, self.generator.generate(1, contains=u"the muddy water"))
+        self.assertRaises(Exception, list, self.generator.generate(1, contains=u"unicorn"))
+        self.assertRaises(Exception, list, self.generator.generate(1, contains=u"Tao",
+                                                                   prefix=u"The"))
+        sentences = self.generator.generate_concurrent(10, workers=2, seed=1, contains=u"water")
+        self.assertTrue(all(u"water" in sentence for sentence in sentences))
+
+class testSeededGeneration(unittest.TestCase):
+    def setUp(self):
+        self.text = read_tao()
+
+    def make_generator(self, rng=None):
+        generator = MarkovGenerator(2, rng=rng)
+        generator.learn(self.text)
+        return generator
+
+    def test_same_seed(self):
+        first = list(self.make_generator(7).generate(30, 80))
+        self.assertEqual(list(self.make_generator(7).generate(30, 80)), first)
+        self.assertNotEqual(list(self.make_generator(8).generate(30, 80)), first)
+        generator = self.make_generator()
+        self.assertEqual(list(generator.generate(30, 80, rng=random.Random(7))), first)
+        self.assertEqual(u"".join(generator.generate_stream(80, rng=7)), first[0])
+
+    def test_generate_concurrent(self):
+        generator = self.make_generator()
+        sentences = generator.generate_concurrent(101, workers=4, max_len=80, seed=3)
+        self.assertEqual(len(sentences), 101)
+        self.assertTrue(all(len(sentence) < 80 for sentence in sentences))
+        self.assertEqual(generator.generation_report["sentences"], 101)
+        self.assertEqual(self.make_generator().generate_concurrent(101, 4, 80, seed=3),
+                         sentences)
+        self.assertNotEqual(generator.generate_concurrent(101, 4, 80, seed=4), sentences)
+
+    def test_generate_does_not_measure(self):
+        generator = self.make_generator()
+        self.assertTrue(generator.compile()["after"] > 0)
+        def memory_usage():
+            raise AssertionError("the graph is measured while generating")
+        generator.graph.memory_usage = memory_usage
+        self.assertEqual(len(list(generator.generate(3, 80))), 3)
+        self.assertEqual(len(generator.generate_concurrent(3, 2, 80, seed=1)), 3)
+        self.assertTrue(u"".join(generator.generate_stream(80)))
+
+class testInstrumentation(unittest.TestCase):
+    def test_stats(self):
+        generator = MarkovGenerator(2, rng=5)
+        self.assertEqual(generator.stats(), {"nodes": 0, "edges": 0,
+                                             "transitions": 0, "tokens": 2})
+        generator.instrument()
+        generator.learn_file(TAO)
+        sentences = list(generator.generate(20, 30, length_aware=False))
+        stats = generator.stats()
+        self.assertEqual(stats["nodes"], generator.graph.num_nodes())
+        self.assertEqual(stats["edges"], generator.graph.num_edges())
+        self.assertEqual(set(stats["timers"]), set(["sentence_split", "token_split",
+                                                    "graph_update", "walk", "render"]))
+        self.assertEqual(stats["timers"]["graph_update"]["calls"], 512)
+        self.assertEqual(sum(stats["walk_lengths"].values()), stats["counters"]["walks"])
+        self.assertEqual(stats["counters"]["walks"] - stats["counters"]["rejections"], 20)
+
+        expected = MarkovGenerator(2, rng=5)
+        expected.learn_file(TAO)
+        self.assertEqual(list(expected.generate(20, 30, length_aware=False)), sentences)
+
+        generator.instrument(False)
+        self.assertFalse("timers" in generator.stats())
+        generator.learn(u"I love your cat.")
+        self.assertEqual(generator.stats()["edges"], generator.graph.num_edges())
+
+class testMemoryBudget(unittest.TestCase):
+    def test_max_memory(self):
+        text = read_tao() * 3
+        full = MarkovGenerator(3)
+        full.learn(text)
+        max_memory = full.graph.memory_usage() // 2
+        for learn in ("learn", "learn_bulk"):
+            generator = MarkovGenerator(3, max_memory=max_memory)
+            getattr(generator, learn)(text)
+            report = generator.pruning_report
+            self.assertTrue(report["prunes"] > 0)
+            self.assertFalse(report["over_budget"])
+            self.assertTrue(generator.graph.memory_usage() < max_memory)
+            self.assertTrue(0 < report["kept_transitions"] < 1)
+            self.assertEqual(generator.stats()["pruning"], report)
+            self.assertEqual(len(list(generator.generate(20))), 20)
+
+    def test_empty_model(self):
+        generator = MarkovGenerator(3, max_memory=1)
+        generator._check_memory()
+        generator.learn(u"")
+        self.assertEqual(generator.pruning_report, None)
+
+    def test_prune(self):
+        generator = MarkovGenerator(2)
+        generator.learn(read_tao())
+        generator.compile()
+        report = generator.prune(2)
+        self.assertTrue(report["after"]["nodes"] < report["before"]["nodes"])
+        self.assertEqual(report["after"], generator.stats())
+        self.assertEqual(len(list(generator.generate(20, 80))), 20)
+
+    def test_strict_prune(self):
+        generator = MarkovGenerator(2)
+        generator.learn(u"you love me. I love you.")
+        self.assertRaises(Exception, generator.graph.prune, 5, strict=True)
+        generator.learn(u"you love me.")
+        generator.graph.prune(2, strict=True)
+        self.assertEqual(list(generator.generate(3)), [u"you love me."]*3)
+
+    def test_dead_end(self):
+        generator = MarkovGenerator(2)
+        generator.learn(u"you love me.")
+        generator.graph.succ[generator.graph.root_node_id()].clear()
+        for max_len in (MAX_INT, 80):
+            with self.assertRaises(Exception) as context:
+                list(generator.generate(1, max_len))
+            self.assertFalse(isinstance(context.exception, IndexError))
+        graph = generator.graph
+        with self.assertRaises(Exception) as context:
+            next(graph.random_walk(graph.root_node_id(), graph.end_node_id()))
+        self.assertFalse(isinstance(context.exception, IndexError))
+
+class testScoring(unittest.TestCase):
+    def test_score(self):
+        generator = MarkovGenerator(1)
+        generator.learn(u"I love cats. I love dogs.")
+        num_outcomes = len(generator.graph.vocab)
+        # START I love cats . END: the 2 ways out of "love" are equally likely
+        self.assertAlmostEqual(generator.score([u"I love cats."], 0)[0], math.log(0.5))
+        expected = (3*math.log(3) - 4*math.log(2 + num_outcomes)
+                    + 2*math.log(2) - math.log(1 + num_outcomes))
+        self.assertAlmostEqual(generator.score([u"I love cats."])[0], expected)
+        self.assertEqual(generator.score([u"I hate cats."], 0), [float("-inf")])
+        self.assertTrue(generator.score([u"I hate cats."])[0] > float("-inf"))
+        self.assertAlmostEqual(generator.perplexity(u"I love cats. I love dogs.", 0),
+                               math.exp(-2*math.log(0.5) / 10))
+        self.assertRaises(Exception, generator.perplexity, u"")
+
+    def test_frozen_score(self):
+        text = read_tao()
+        sentences = [u"The sage is empty.", u"The way that can be told is not the way.",
+                     u"Nothing here was ever learnt, zebra!"]
+        for order in (1, 2, 3):
+            generator = MarkovGenerator(order)
+            generator.learn(text)
+            expected = generator.score(sentences)
+            expected_perplexity = generator.perplexity(text)
+            generator.compile()
+            for log_prob, frozen_log_prob in zip(expected, generator.score(sentences)):
+                self.assertAlmostEqual(log_prob, frozen_log_prob)
+            self.assertAlmostEqual(generator.perplexity(text), expected_perplexity)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from markogen.frozen import FrozenMarkovGraph
+from markogen.generators import MarkovGenerator, JOURNAL_SUFFIX
+
+BASE = u"I love your puppy. I love your cat! Your cat loves me, not you."
+NEW = u"Your puppy loves me. I love your puppy, not your cat."
+NEWER = u"Nobody loves a cat that bites."
+
+def edges(generator):
+    generator.compile()
+    graph = generator.graph
+    return sorted((graph.node_tokens(node), graph.node_tokens(succ), sorted(data.items()))
+                  for node in range(graph.num_nodes())
+                  for _, succ, data in graph.out_edges_iter(node))
+
+class testDeltaJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "model.bin")
+        generator = MarkovGenerator(2)
+        generator.learn(BASE)
+        generator.save(self.path)
+        self.expected = MarkovGenerator(2)
+        for text in (BASE, NEW, NEWER):
+            self.expected.learn(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_learn_appends(self):
+        base = self.read(self.path)
+        generator = MarkovGenerator.load(self.path)
+        generator.learn(NEW)
+        generator.learn_bulk(NEWER)
+        # the base is neither thawed nor rewritten
+        self.assertTrue(isinstance(generator._graph, FrozenMarkovGraph))
+        self.assertEqual(self.read(self.path), base)
+        self.assertEqual(generator.journal.stats()["records"], 2)
+        self.assertEqual(edges(generator), edges(self.expected))
+        self.assertEqual(edges(MarkovGenerator.load(self.path)), edges(self.expected))
+
+    def test_learn_after_replay(self):
+        generator = MarkovGenerator.load(self.path)
+        generator.learn(NEW)
+        generator = MarkovGenerator.load(self.path)
+        self.assertEqual(generator.stats()["journal"]["records"], 1)
+        generator.learn(NEWER)
+        self.assertEqual(edges(MarkovGenerator.load(self.path)), edges(self.expected))
+
+    def test_compact(self):
+        generator = MarkovGenerator.load(self.path)
+        generator.learn(NEW)
+        generator.learn(NEWER)
+        report = generator.compact()
+        self.assertEqual(report["records"], 2)
+        self.assertFalse(os.path.exists(self.path + JOURNAL_SUFFIX))
+        self.assertTrue(isinstance(generator.graph, FrozenMarkovGraph))
+        loaded = MarkovGenerator.load(self.path)
+        self.assertEqual(loaded.stats()["journal"]["records"], 0)
+        self.assertEqual(edges(loaded), edges(self.expected))
+        self.assertRaises(Exception, MarkovGenerator(2).compact)
+
+    def test_stale_journal(self):
+        generator = MarkovGenerator.load(self.path)
+        generator.learn(NEW)
+        generator.learn(NEWER)
+        journal = self.read(self.path + JOURNAL_SUFFIX)
+        generator.compact()
+        # as if compacting had stopped right after writing the new base
+        with open(self.path + JOURNAL_SUFFIX, "wb") as f:
+            f.write(journal)
+        self.assertEqual(edges(MarkovGenerator.load(self.path)), edges(self.expected))
+
+    def test_torn_record(self):
+        generator = MarkovGenerator.load(self.path)
+        generator.learn(NEW)
+        with open(self.path + JOURNAL_SUFFIX, "ab") as f:
+            f.write(b"\x05\x00\x00\x00 half a record")
+        generator = MarkovGenerator.load(self.path)
+        self.assertEqual(generator.stats()["journal"]["records"], 1)
+        generator.learn(NEWER)
+        self.assertEqual(edges(MarkovGenerator.load(self.path)), edges(self.expected))
+
+    def test_originality(self):
+        generator = MarkovGenerator(2, originality=True)
+        generator.learn(BASE)
+        generator.save(self.path)
+        generator = MarkovGenerator.load(self.path)
+        generator.learn(NEW)
+        generator.learn_bulk(NEWER)
+        # the filter file is not rewritten, the journal holds the sentences
+        generator = MarkovGenerator.load(self.path)
+        for sentence in (u"Your puppy loves me.", NEWER):
+            self.assertTrue(generator.originality.copies(sentence))
+        self.assertFalse(generator.originality.copies(u"Nobody loves your puppy."))
+        generator.compact()
+        generator = MarkovGenerator.load(self.path)
+        for sentence in (u"Your puppy loves me.", NEWER):
+            self.assertTrue(generator.originality.copies(sentence))
+
+    def test_concurrent_writers(self):
+        first = MarkovGenerator.load(self.path)
+        second = MarkovGenerator.load(self.path)
+        first.learn(NEW)
+        second.learn(NEWER)
+        loaded = MarkovGenerator.load(self.path)
+        self.assertEqual(loaded.stats()["journal"]["records"], 2)
+        self.assertEqual(edges(loaded), edges(self.expected))
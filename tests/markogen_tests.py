@@ -1,6 +1,7 @@
 
 from nose.tools import *
 from collections import deque
+from random import Random, seed as random_seed
 
 import unittest
 
@@ -43,9 +44,20 @@ class testGraphModel(unittest.TestCase):
         g.add_edge(0,1)
         self.assertEqual(g.edge_count(0,1), 3)
         self.assertEqual(g.edge_count(1,2), 0)
-        self.assertEqual(g.node_by_id(0), g.node_by_tokens("adogloves"))
-        self.assertEqual(g.node_by_id(0),
-                         {'token_1':'dog','token_0':'a','token_2':'loves'})
+        self.assertEqual(g.node_by_id(0), g.node_by_tokens(["a", "dog", "loves"]))
+        self.assertEqual(g.node_tokens(0), ('a', 'dog', 'loves'))
+
+    def test_vocabulary(self):
+        g = MarkovGraph(order = 2)
+        ab_c = g.add_token_node(["ab", "c"])
+        a_bc = g.add_token_node(["a", "bc"])
+        self.assertNotEqual(ab_c, a_bc)
+        self.assertEqual(g.num_nodes(), 2)
+        self.assertEqual(g.add_token_node(["a", "bc"]), a_bc)
+        self.assertEqual(len(g.vocab), 6) # [START], [END], ab, c, a, bc
+        self.assertEqual(g.node_by_id(a_bc),
+                         (g.vocab.id_of("a"), g.vocab.id_of("bc")))
+        self.assertRaises(Exception, g.node_id_by_tokens, ["a", "zz"])
 
     def test_random_step(self):
         g = MarkovGraph(order = 3)
@@ -62,12 +74,34 @@ class testGraphModel(unittest.TestCase):
         self.assertEqual(g.num_edges(unique=False), 5)
         counters = {1:0, 2:0}
         SAMPLES = 100000
-        for i in xrange(SAMPLES):
+        for i in range(SAMPLES):
             step = g.random_step(0)
             counters[step[0]] += 1
         self.assertAlmostEqual(0.6, counters[1]*1.0/SAMPLES, 2)
         self.assertAlmostEqual(0.4, counters[2]*1.0/SAMPLES, 2)
 
+    def test_frozen_random_step(self):
+        g = MarkovGraph(order = 3)
+        tokens = "a dogs love me not".split()
+        for token_group in sliding_window(tokens, 3):
+            g.add_token_node(token_group)
+        for _ in range(3):
+            g.add_edge(0,1)
+        for _ in range(2):
+            g.add_edge(0,2)
+        g.freeze()
+        self.assertTrue(g.is_frozen())
+        counters = {1:0, 2:0}
+        SAMPLES = 100000
+        for i in range(SAMPLES):
+            succ, weight = g.random_step(0)
+            counters[succ] += 1
+            self.assertEqual(weight, g.edge_count(0, succ))
+        self.assertAlmostEqual(0.6, counters[1]*1.0/SAMPLES, 2)
+        self.assertAlmostEqual(0.4, counters[2]*1.0/SAMPLES, 2)
+        g.add_edge(1,2)
+        self.assertFalse(g.is_frozen())
+
     def test_tokenize(self):
         sentence = "a dog loves me not"
         g = MarkovGraph(order=2)
@@ -80,6 +114,94 @@ class testGraphModel(unittest.TestCase):
         self.assertEqual(g.num_nodes(), 9)
         self.assertEqual(g.num_edges(), 8)
 
+    def test_count_transitions(self):
+        sentences = ["i love your cat", "i love,your  cat.", "i  love your cat"]
+        g = MarkovGraph(order=2)
+        counts = g.count_transitions(sentences)
+        self.assertEqual(g.num_nodes(), 0)
+        expected = MarkovGraph(order=2)
+        for sentence in sentences:
+            expected.update_by_sentence(sentence)
+        g.add_transition_counts(counts)
+        self.assertEqual(g.toks, expected.toks)
+        self.assertEqual(g.succ, expected.succ)
+        love_your = g.node_id_by_tokens([",", "your"])
+        self.assertFalse(g.get_edge(g.node_id_by_tokens(["love", ","]), love_your)["has_space"])
+        self.assertEqual(g.edge_count(g.node_id_by_tokens(["love", "your"]),
+                                      g.node_id_by_tokens(["your", "cat"])), 2)
+
+    def test_edge_views(self):
+        g = MarkovGraph(order=2)
+        g.update_by_sentence("i love your cat")
+        g.update_by_sentence("i love  your dog")
+        love_your = g.node_id_by_tokens(["love", "your"])
+        i_love = g.node_id_by_tokens(["i", "love"])
+        edge = g.get_edge(i_love, love_your)
+        self.assertEqual(edge, {"count": 2, "has_space": True})
+        self.assertEqual(dict(edge), {"count": 2, "has_space": True})
+        transitions = g.num_edges(unique=False)
+        edge["count"] += 1
+        self.assertEqual(g.edge_count(i_love, love_your), 3)
+        self.assertEqual(g.num_edges(unique=False), transitions + 1)
+        g.update_edge_attrs(i_love, love_your, count=10)
+        self.assertEqual(g.num_edges(unique=False), transitions + 8)
+        self.assertEqual(g.stats()["transitions"], transitions + 8)
+        g.update_edge_attrs(i_love, love_your, count=3)
+        self.assertTrue(g.get_edge(i_love, love_your)["has_space"])
+        self.assertRaises(KeyError, g.get_edge, love_your, i_love)
+        self.assertEqual(g.predecessors(love_your), [i_love])
+        self.assertEqual(g.pred[love_your][i_love], g.succ[i_love][love_your])
+        for succ in g.successors(love_your):
+            self.assertEqual(g.predecessors(succ), [love_your])
+        g.update_by_sentence("you love your cat")
+        self.assertEqual(len(g.predecessors(love_your)), 2)
+
+    def test_prune(self):
+        g = MarkovGraph(order=2)
+        for sentence in ["i love your cat", "i love your cat", "i love your dog",
+                         "you love me"]:
+            g.update_by_sentence(sentence)
+        report = g.prune(2)
+        self.assertEqual(report["before"]["nodes"], 13)
+        self.assertEqual(report["after"], g.stats())
+        self.assertEqual(g.num_nodes(), 7) # the root, the end, i love your cat
+        self.assertEqual(list(g.vocab), ["[START]", "[END]", "i", "love", "your", "cat"])
+        self.assertEqual(sorted(g.toks.values()), list(range(7)))
+        self.assertEqual(g.num_edges(unique=False), 15)
+        self.assertEqual(report["kept"]["transitions"], 15 / 23.0)
+        root, end = g.root_node_id(), g.end_node_id()
+        self.assertEqual(g._path_to_string(next(g.random_walk(root, end))), "i love your cat")
+
+        # the best transition of a node is kept, unless strict
+        g = MarkovGraph(order=2)
+        g.update_by_sentence("you love me")
+        self.assertEqual(g.prune(2)["kept"]["edges"], 1.0)
+        # strict pruning would leave no sentence, and refuses
+        num_edges = g.num_edges()
+        self.assertRaises(Exception, g.prune, 2, strict=True)
+        self.assertEqual(g.num_edges(), num_edges)
+        g.update_by_sentence("you love me")
+        g.update_by_sentence("i love you")
+        g.prune(2, strict=True)
+        self.assertEqual(g.num_edges(), num_edges)
+        self.assertEqual(g.num_edges(unique=False), 2*num_edges)
+
+    def test_stats(self):
+        sentences = ["i love your cat", "i love,your  cat.", "i  love your cat"]
+        g, bulk = MarkovGraph(order=2), MarkovGraph(order=2)
+        for sentence in sentences:
+            g.update_by_sentence(sentence)
+        bulk.add_transition_counts(bulk.count_transitions(sentences))
+        for graph in (g, bulk):
+            edges = [datadict for node in graph for _, _, datadict in graph.out_edges_iter(node)]
+            self.assertEqual(graph.num_edges(), len(edges))
+            self.assertEqual(graph.num_edges(unique=False),
+                             sum(datadict["count"] for datadict in edges))
+            self.assertEqual(graph.stats(), {"nodes": graph.num_nodes(),
+                                             "edges": graph.num_edges(),
+                                             "transitions": 20,
+                                             "tokens": 8})
+
     def test_random_walk(self):
         sentence = "i love your bunny cun."
         g = MarkovGraph(order=3)
@@ -95,3 +217,36 @@ class testGraphModel(unittest.TestCase):
         root,end = g.root_node_id(), g.end_node_id()
         path = next(g.random_walk(root,end))
         phrase = g._path_to_string(path)
+
+    def test_iter_tokens(self):
+        g = MarkovGraph(order=2)
+        for sentence in ["i love your puppy, and cat", "i love you.", "your cat loves me"]:
+            g.update_by_sentence(sentence)
+        root, end = g.root_node_id(), g.end_node_id()
+        for seed in range(20):
+            random_seed(seed)
+            phrase = g._path_to_string(next(g.random_walk(root, end)))
+            random_seed(seed)
+            self.assertEqual("".join(g.iter_tokens(root, end)), phrase)
+
+    def test_bounded_walks(self):
+        g = MarkovGraph(order=2)
+        for sentence in ["i love your puppy, and cat", "i love you.", "your cat loves me"]:
+            g.update_by_sentence(sentence)
+        root, end = g.root_node_id(), g.end_node_id()
+        for seed in range(20):
+            phrase = g._path_to_string(next(g.random_walk(root, end, 15, Random(seed))))
+            self.assertTrue(len(phrase) < 15)
+            self.assertEqual("".join(g.iter_tokens(root, end, 15, Random(seed))), phrase)
+            self.assertEqual(next(g.random_walk(root, end, None, Random(seed))),
+                             next(g.random_walk(root, end, rng=Random(seed))))
+        self.assertEqual(list(g.random_walk(root, end, 5)), [])
+        # the compiled copy is kept until the graph changes
+        compiled = g._compiled()
+        next(g.random_walk(root, end, 15))
+        self.assertTrue(g._compiled() is compiled)
+        g.update_by_sentence("you love me")
+        self.assertFalse(g._compiled() is compiled)
+        compiled = g._compiled()
+        g.get_edge(root, g.node_id_by_tokens(["[START]", "you"]))["has_space"] = True
+        self.assertFalse(g._compiled() is compiled)
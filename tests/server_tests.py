@@ -0,0 +1,70 @@
+import asyncio
+import json
+import unittest
+
+from markogen.generators import MarkovGenerator
+from markogen.server import GenerationServer
+
+TEXT = u"I love your cat. I love your dog, not you. Your cat loves me."
+
+class testGenerationServer(unittest.TestCase):
+    def setUp(self):
+        generator = MarkovGenerator(2)
+        generator.learn(TEXT)
+        self.server = GenerationServer(generator, max_len=100, concurrency=4)
+
+    def run_with_server(self, client):
+        async def scenario():
+            host, port = await self.server.start("127.0.0.1", 0)
+            try:
+                return await client(host, port)
+            finally:
+                await self.server.close()
+        return asyncio.run(scenario())
+
+    @staticmethod
+    async def request(host, port, *lines):
+        reader, writer = await asyncio.open_connection(host, port)
+        responses = []
+        for line in lines:
+            writer.write((line + "\n").encode("utf-8"))
+            await writer.drain()
+            responses.append(json.loads((await reader.readline()).decode("utf-8")))
+        writer.close()
+        return responses
+
+    def test_request(self):
+        responses = self.run_with_server(lambda host, port: self.request(
+            host, port, json.dumps({"n": 3}), "", json.dumps({"n": 2, "max_len": 17})))
+        self.assertEqual(len(responses[0]["sentences"]), 3)
+        self.assertEqual(len(responses[1]["sentences"]), 1)
+        self.assertEqual(responses[2]["sentences"], [u"I love your cat."] * 2)
+        for response in responses:
+            self.assertTrue(response["latency_ms"] >= 0)
+
+    def test_errors(self):
+        responses = self.run_with_server(lambda host, port: self.request(
+            host, port, "not json", json.dumps({"n": 0}), json.dumps({"max_len": 3}),
+            json.dumps({"n": 1})))
+        self.assertTrue(all("error" in response for response in responses[:3]))
+        self.assertEqual(len(responses[3]["sentences"]), 1)
+
+    def test_failed_batch(self):
+        generate = self.server._generate
+        def fail_once(requests):
+            self.server._generate = generate
+            raise Exception("the batch failed")
+        self.server._generate = fail_once
+        responses = self.run_with_server(lambda host, port: self.request(
+            host, port, json.dumps({"n": 1}), json.dumps({"n": 2})))
+        self.assertEqual(responses[0], {"error": "the batch failed"})
+        self.assertEqual(len(responses[1]["sentences"]), 2)
+
+    def test_concurrent_clients(self):
+        async def clients(host, port):
+            return await asyncio.gather(*[self.request(host, port, json.dumps({"n": 5}))
+                                          for _ in range(20)])
+        responses = self.run_with_server(clients)
+        self.assertEqual(len(responses), 20)
+        for (response,) in responses:
+            self.assertEqual(len(response["sentences"]), 5)
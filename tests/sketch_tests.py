@@ -0,0 +1,67 @@
+import random
+import unittest
+
+from markogen.models import MarkovGraph
+from markogen.sketch import CountMinSketch, SketchMarkovGraph
+from markogen.generators import MarkovGenerator, SketchMarkovGenerator
+from .frozen_tests import SENTENCES
+from .generators_tests import read_tao
+
+class testCountMinSketch(unittest.TestCase):
+    def test_never_underestimates(self):
+        sketch = CountMinSketch(width=64, depth=3)
+        rng = random.Random(0)
+        counts = {}
+        for _ in range(2000):
+            key = int(rng.paretovariate(1.0)) * 7919
+            counts[key] = counts.get(key, 0) + 1
+            self.assertEqual(sketch.add(key), sketch.estimate(key))
+        for key, count in counts.items():
+            self.assertTrue(sketch.estimate(key) >= count)
+
+    def test_wide_sketch_is_exact(self):
+        sketch = CountMinSketch(width=1 << 16)
+        for key in range(100):
+            sketch.add(key, key + 1)
+        self.assertEqual([sketch.estimate(key) for key in range(100)],
+                         list(range(1, 101)))
+
+class testSketchMarkovGraph(unittest.TestCase):
+    def test_same_as_exact(self):
+        exact, sketched = MarkovGraph(order=2), SketchMarkovGraph(order=2, width=1 << 16)
+        for sentence in SENTENCES:
+            exact.update_by_sentence(sentence)
+            sketched.update_by_sentence(sentence)
+        sketched.refresh()
+        self.assertEqual(sketched.succ, exact.succ)
+        self.assertEqual(sketched.num_edges(unique=False), exact.num_edges(unique=False))
+
+    def test_heavy_hitters(self):
+        graph = SketchMarkovGraph(order=1, heavy_hitters=2)
+        graph.add_transition_counts(graph.count_transitions(
+            ["a b", "a c", "a c", "a d", "a d", "a d"]))
+        node = graph.node_id_by_tokens(["a"])
+        self.assertEqual(sorted(graph.node_tokens(succ)[0] for succ in graph.succ[node]),
+                         ["c", "d"])
+        self.assertTrue(max(len(nbrs) for nbrs in graph.succ) <= 2)
+        self.assertEqual(graph.num_edges(), sum(len(nbrs) for nbrs in graph.succ))
+        self.assertEqual(graph.num_edges(unique=False), 18)
+        self.assertRaises(Exception, graph.prune, 2)
+
+class testSketchMarkovGenerator(unittest.TestCase):
+    def test_generate(self):
+        text = read_tao()
+        generator = SketchMarkovGenerator(2, width=1 << 12, heavy_hitters=4, rng=0)
+        generator.learn_bulk(text)
+        sketch = generator.graph
+        self.assertTrue(max(len(nbrs) for nbrs in sketch.succ) <= 4)
+        sentences = list(generator.generate(20, 100))
+        self.assertEqual(len(sentences), 20)
+        self.assertTrue(all(len(sentence) < 100 for sentence in sentences))
+        # learning again carries on with the sketch
+        generator.learn(u"Something new entirely.")
+        self.assertTrue(generator.graph is sketch)
+        exact = MarkovGenerator(2)
+        exact.learn_bulk(text)
+        exact.learn(u"Something new entirely.")
+        self.assertEqual(sketch.num_edges(unique=False), exact.graph.num_edges(unique=False))
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from markogen.frozen import FrozenMarkovGraph
+from markogen.generators import MarkovGenerator
+from markogen.storage import MAGIC
+
+TEXT = u"I love your puppy. I love your cat! Your cat loves me, not you. "\
+       u"Café au lait, s'il vous plaît."
+
+class testStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "model.bin")
+        self.generator = MarkovGenerator(2)
+        self.generator.learn(TEXT)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        self.generator.save(self.path)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(4), MAGIC)
+        loaded = MarkovGenerator.load(self.path)
+        graph, expected = loaded.graph, self.generator.graph
+        self.assertTrue(isinstance(graph, FrozenMarkovGraph))
+        self.assertEqual(graph.order, 2)
+        self.assertEqual(list(graph.tokens), expected.vocab.tokens)
+        self.assertEqual(graph.num_nodes(), expected.num_nodes())
+        self.assertEqual(graph.num_edges(unique=False), expected.num_edges(unique=False))
+        for node in range(expected.num_nodes()):
+            self.assertEqual(graph.node_tokens(node), expected.node_tokens(node))
+            for _, succ, datadict in expected.out_edges_iter(node):
+                self.assertEqual(graph.get_edge(node, succ), datadict)
+        self.assertEqual(graph.root_node_id(), expected.root_node_id())
+        self.assertEqual(graph.end_node_id(), expected.end_node_id())
+        self.assertEqual(len(list(loaded.generate(5))), 5)
+
+    def test_same_state(self):
+        self.generator.save(self.path)
+        self.assertEqual(sorted(vars(MarkovGenerator.load(self.path))),
+                         sorted(vars(MarkovGenerator(2))))
+
+    def test_learn_after_load(self):
+        self.generator.compile()
+        self.generator.save(self.path)
+        loaded = MarkovGenerator.load(self.path)
+        loaded.learn(u"Your puppy loves me.")
+        self.assertEqual(loaded.graph.num_edges(unique=False),
+                         self.generator.graph.num_edges(unique=False) + 7)
+        loaded.save(self.path + ".2")
+        self.assertEqual(MarkovGenerator.load(self.path + ".2").graph.num_nodes(),
+                         loaded.graph.num_nodes())
+
+    def test_length_tables(self):
+        self.generator.save(self.path)
+        expected = FrozenMarkovGraph.from_graph(self.generator.graph)._length_tables()
+        graph = MarkovGenerator.load(self.path).graph
+        self.assertEqual([list(table) for table in graph._length_arrays],
+                         [list(table) for table in expected])
+        # models written without the tables build them on first use
+        with open(self.path, "r+b") as f:
+            f.seek(9)
+            f.write(b"\0")
+        graph = MarkovGenerator.load(self.path).graph
+        self.assertTrue(graph._length_arrays is None)
+        self.assertEqual([list(table) for table in graph._length_tables()],
+                         [list(table) for table in expected])
+
+    def test_bad_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a model at all, definitely not" * 4)
+        self.assertRaises(Exception, MarkovGenerator.load, self.path)
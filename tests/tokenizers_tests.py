@@ -1,5 +1,14 @@
+import io
+import os.path
+import re
+import tempfile
 import unittest
 
+try:
+    import nltk
+except ImportError:
+    nltk = None
+
 # from markogen import MarkovStemmer, Tokenizer, SentenceTokenizer,\
 #     split_single, split_multi
 
@@ -9,6 +18,8 @@ import logging
 
 log = logging.getLogger('markov')
 
+TAO = os.path.join(os.path.dirname(__file__), "..", "inputs", "tao.txt")
+
 class testHappySequenceTokenizer(unittest.TestCase):
     def setUp(self):
         self.tokenizer = HappyTokenizer(True)
@@ -61,6 +72,49 @@ class testDefaultSequenceTokenizer(unittest.TestCase):
         self.assertEqual(len(sentences), 2)
 
 
+    def test_split_stream(self):
+        with io.open(TAO, encoding="utf-8") as f:
+            text = f.read()
+        expected = SentenceTokenizer().split(text)
+        for size in (1, 7, 100, 4096, len(text)):
+            chunks = (text[i:i+size] for i in range(0, len(text), size))
+            self.assertEqual(list(self.tokenizer.split_stream(chunks)), expected)
+
+    def test_split_stream_boundaries(self):
+        chunks = [u"Is that his ", u"name?", u" Yes.", u"   ", u"No"]
+        self.assertEqual(list(self.tokenizer.split_stream(chunks)),
+                         [u"Is that his name?", u"Yes.", u"No"])
+        self.assertEqual(list(self.tokenizer.split_stream([u"  ", u"..."])), [])
+
+    def test_split_stream_long_sentence(self):
+        tokenizer = SentenceTokenizer()
+        tokenizer.max_carry = 20
+        words = u" ".join(u"word%d"%i for i in range(100))
+        chunks = [words[i:i+7] for i in range(0, len(words), 7)] + [u". Done."]
+        sentences = list(tokenizer.split_stream(chunks))
+        self.assertTrue(all(len(sentence) <= 27 for sentence in sentences))
+        self.assertEqual(u" ".join(sentences), words + u". Done.")
+
+    def test_token_streams(self):
+        with io.open(TAO, encoding="utf-8") as f:
+            text = f.read() + u"  Tabs\tand   spaces ;-) . , . e.g. http://x.y/z?a=1 ok!  "
+        for tokenizer in (CobeTokenizer(), Tokenizer()):
+            expected = [tokenizer.split(sentence) for sentence in self.tokenizer.split(text)]
+            for size in (100, len(text)):
+                chunks = (text[i:i+size] for i in range(0, len(text), size))
+                streams = self.tokenizer.token_streams(chunks, tokenizer)
+                self.assertEqual([[token if token.strip() else u" " for token in tokens]
+                                  for tokens in streams], expected)
+
+class testLazyPattern(unittest.TestCase):
+    def test_compiled_on_first_use(self):
+        pattern = LazyPattern(r"\w+", re.UNICODE)
+        self.assertTrue(pattern._compiled is None)
+        self.assertEqual(pattern.findall(u"I love cats"), [u"I", u"love", u"cats"])
+        compiled = pattern._compiled
+        self.assertEqual(pattern.findall(u"dogs"), [u"dogs"])
+        self.assertTrue(pattern._compiled is compiled)
+
 class testNLTKSentenceTokenizer(unittest.TestCase):
     """Doc string"""
     def setUp(self):
@@ -71,6 +125,34 @@ class testNLTKSentenceTokenizer(unittest.TestCase):
         sentences = NLTKSentenceTokenizer().split(text)
         self.assertEqual(len(sentences), 3)
 
+    def test_lazy_splitter(self):
+        tokenizer = NLTKSentenceTokenizer(abbreviations=["Dr.", "etc"])
+        self.assertEqual(tokenizer.abbreviations, set(["dr", "etc"]))
+        self.assertTrue(tokenizer.punkt is None)
+
+    @unittest.skipIf(nltk is None, "nltk is not installed")
+    def test_cached_splitter(self):
+        splitter = self.tokenizer._splitter()
+        self.tokenizer.split(u"Hello Mr. Smith. How are you?")
+        self.assertTrue(self.tokenizer._splitter() is splitter)
+        self.assertEqual(self.tokenizer.split(u"Hello Mr. Smith. How are you?"),
+                         [u"Hello Mr. Smith.", u"How are you?"])
+
+    @unittest.skipIf(nltk is None, "nltk is not installed")
+    def test_train_save_load(self):
+        with io.open(TAO, encoding="utf-8") as f:
+            text = f.read()
+        path = tempfile.mktemp()
+        try:
+            trained = NLTKSentenceTokenizer().train(text)
+            trained.save(path)
+            loaded = NLTKSentenceTokenizer(params_path=path)
+            self.assertTrue(loaded.params is None)
+            self.assertEqual(loaded.split(text), trained.split(text))
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
 class testCobeTokenTokenizer(unittest.TestCase):
     def setUp(self):
         self.tokenizer = CobeTokenizer()
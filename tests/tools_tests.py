@@ -2,5 +2,18 @@ import unittest
 from markogen import tools
 
 class testTools(unittest.TestCase):
-    pass
+
+    def test_cumulative_table(self):
+        items, cumulative = tools.cumulative_table([("a", 2), ("b", 3)])
+        self.assertEqual(items, ("a", "b"))
+        self.assertEqual(cumulative, (2, 5))
+
+    def test_cumulative_choice(self):
+        items, cumulative = tools.cumulative_table([("a", 1), ("b", 0), ("c", 3)])
+        counters = {"a": 0, "b": 0, "c": 0}
+        for _ in range(10000):
+            choice, weight = tools.cumulative_choice(items, cumulative)
+            counters[choice] += 1
+        self.assertEqual(counters["b"], 0)
+        self.assertAlmostEqual(0.25, counters["a"]/10000.0, 1)
 
@@ -0,0 +1,86 @@
+import unittest
+
+import six
+
+from markogen.models import MarkovGraph
+from markogen.trie import ContextTrie
+from markogen.generators import BackoffMarkovGenerator
+from .frozen_tests import SENTENCES
+from .generators_tests import read_tao
+
+class testContextTrie(unittest.TestCase):
+    def setUp(self):
+        self.trie = ContextTrie(max_order=3)
+        for sentence in SENTENCES:
+            self.trie.update_by_sentence(sentence)
+
+    def assertSameCounts(self, order):
+        """The contexts of ``order`` hold the transitions of the order-n graph"""
+        graph, trie = MarkovGraph(order=order), self.trie
+        for sentence in SENTENCES:
+            graph.update_by_sentence(sentence)
+        for node, nbrs in enumerate(graph.succ):
+            tokens = graph.node_tokens(node)
+            if tokens[-1] == graph.END_TOKEN:
+                continue
+            ids = [trie.vocab.id_of(token) for token in tokens]
+            context = trie.context_node(ids, order)
+            self.assertEqual(trie.context_tokens(context), tokens)
+            expected = {trie.vocab.id_of(graph.node_tokens(succ)[-1]): packed
+                        for succ, packed in six.iteritems(nbrs)}
+            self.assertEqual(trie.successors(context), expected)
+
+    def test_counts(self):
+        for order in (1, 2, 3):
+            self.assertSameCounts(order)
+        self.assertEqual(self.trie.stats()["nodes_by_order"][0], 1)
+        self.assertEqual(self.trie.num_edges(unique=False), 24)
+        self.assertEqual(sum(self.trie.successors(0)[token_id] >> 1
+                             for token_id in self.trie.successors(0)), 24)
+
+    def test_backoff(self):
+        trie, vocab = self.trie, self.trie.vocab
+        ids = [vocab.id_of(token) for token in ("love", "your", "cat")]
+        self.assertEqual(trie.context_tokens(trie.context_node(ids)), ("love", "your", "cat"))
+        # "love your cat" was seen twice, "your cat" three times
+        self.assertEqual(trie.context_tokens(trie.context_node(ids, min_support=3)),
+                         ("your", "cat"))
+        self.assertEqual(trie.context_tokens(trie.context_node(ids, max_order=1)), ("cat",))
+        self.assertEqual(trie.context_node([vocab.id_of("me")] + ids, min_support=100), 0)
+
+class testBackoffMarkovGenerator(unittest.TestCase):
+    def test_generate(self):
+        generator = BackoffMarkovGenerator(3, rng=0)
+        self.assertEqual(generator.learn(read_tao()), 512)
+        for max_order, min_support in ((None, 2), (1, 1), (3, 1)):
+            sentences = list(generator.generate(20, 100, max_order, min_support))
+            self.assertEqual(len(sentences), 20)
+            self.assertTrue(all(0 < len(sentence) < 100 for sentence in sentences))
+        self.assertEqual(generator.generation_report["sentences"], 20)
+
+    def test_backoff_spacing(self):
+        """Backing off to a short context mid-sentence does not glue the
+        token to the previous one
+        """
+        generator = BackoffMarkovGenerator(3, rng=0)
+        generator.learn(read_tao())
+        vocab, split = generator.graph.vocab, generator.graph.tokenizer.split
+        for sentence in generator.generate(300):
+            for token in split(sentence):
+                self.assertTrue(token == u" " or token in vocab, token)
+
+    def test_plain_chain(self):
+        """Without backoff the sentences only use the transitions of the
+        order-n chain
+        """
+        generator = BackoffMarkovGenerator(2, rng=1)
+        for sentence in SENTENCES:
+            generator.learn(sentence)
+        graph = MarkovGraph(order=2)
+        for sentence in SENTENCES:
+            graph.update_by_sentence(sentence)
+        for sentence in generator.generate(30, max_order=2, min_support=1):
+            tokens = [token for token in graph._tokenize(sentence) if token != " "]
+            for prev, curr in zip(zip(tokens, tokens[1:]), zip(tokens[1:], tokens[2:])):
+                self.assertTrue(graph.edge_count(graph.node_id_by_tokens(prev),
+                                                 graph.node_id_by_tokens(curr)) > 0)